@@ -1,11 +1,19 @@
 """
 Client and server using classes
+
+Wire protocol: requests and responses are frames of newline-delimited JSON (one JSON object per line,
+JSON escapes newlines within strings). Each request is answered by one response frame, except for
+responses streamed in chunks (GETALL): all of their frames but the last carry "more": true, and the
+client joins the "data" lists of all frames.
 """
+import itertools
 import json
 import logging
+import selectors
 import socket
+import time
 from abc import ABC
-from pprint import pprint
+from collections.abc import Iterator
 from typing import TypedDict, Literal, Any
 
 import const_cs
@@ -13,6 +21,10 @@ from context import lab_logging
 
 lab_logging.setup(stream_level=logging.INFO)  # init loging channels for the lab
 
+CHUNK_SIZE = 100  # entries per frame of streamed responses
+OUTGOING_LIMIT = 64 * 1024  # bytes of encoded frames buffered per connection before waiting for the client
+MAX_REQUEST_SIZE = 64 * 1024  # longest request frame accepted by the server
+
 
 type QueryType = Literal["GET", "GETALL"]
 
@@ -31,10 +43,23 @@ def parse_query(request: bytes) -> tuple[QueryType, dict[str, Any]]:
 type Response = dict[str, Any]
 
 def encode_response(response: Response) -> bytes:
-    return json.dumps(response).encode('utf-8')
+    return json.dumps(response).encode('utf-8') + b"\n"
+
+def encode_frames(response: Response, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """ Encode a response lazily as frames (data iterators are streamed in chunks of chunk_size entries) """
+    data = response.get("data")
+    if not isinstance(data, Iterator):
+        yield encode_response(response)
+        return
+    chunks = itertools.batched(data, chunk_size)
+    chunk = next(chunks, ())
+    for following in chunks:  # look ahead to mark all frames but the last one
+        yield encode_response({"data": list(chunk), "more": True})
+        chunk = following
+    yield encode_response({"data": list(chunk)})
 
 def encode_request(query_type: QueryType, data: dict[str, Any]) -> bytes:
-    return json.dumps({"type": query_type, "data": data}).encode('utf-8')
+    return json.dumps({"type": query_type, "data": data}).encode('utf-8') + b"\n"
 
 def decode_response(response: bytes) -> Response:
     return json.loads(response)
@@ -52,17 +77,61 @@ def response(detail: dict[str, Any]) -> Response:
     """ Return response """
     return {"data": detail}
 
+class Connection:
+    """ A client connection of the server, its buffered request data and the response data not sent yet """
+
+    def __init__(self, sock: socket.socket, address):
+        self.sock = sock
+        self.address = address
+        self.incoming = bytearray()
+        self.outgoing = bytearray()
+        self.frames: Iterator[bytes] | None = None  # frames of the response being sent
+
+    def next_request(self) -> bytes | None:
+        """ Take the next complete request frame off the incoming data """
+        end = self.incoming.find(b"\n")
+        if end < 0:
+            return None
+        request = bytes(self.incoming[:end])
+        del self.incoming[:end + 1]
+        return request
+
+
 class Server:
-    """ The server """
+    """
+    The server
+
+    The server serves many clients concurrently in a single thread: an event loop (selectors) waits
+    until the listening socket or client connections are ready and then accepts connections, reads
+    requests or sends (the rest of) responses without blocking. A slow client therefore does not stall
+    the others. Requests are handled one after another by handle_query.
+
+    Responses are encoded frame by frame while they are sent, and only up to OUTGOING_LIMIT bytes are
+    buffered per connection. GETALL streams the phonebook in chunks without building the whole list.
+    """
     _logger = logging.getLogger("vs2lab.lab1.clientserver.Server")
     _serving = True
 
-    def __init__(self, db: dict[str, str] = None):
+    def __init__(self, db: dict[str, str] = None, backlog: int = socket.SOMAXCONN, shutdown_timeout: float = 3,
+                 chunk_size: int = CHUNK_SIZE):
+        """
+        :param db: phonebook of names and numbers
+        :param backlog: number of connections the operating system queues until the server accepts them
+        :param shutdown_timeout: seconds to finish sending pending responses when stopping
+        :param chunk_size: entries per frame of streamed responses
+        """
         self.db: dict[str, str] = db or {}
+        self.backlog = backlog
+        self.shutdown_timeout = shutdown_timeout
+        self.chunk_size = chunk_size
         self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)  # prevents errors due to "addresses in use"
         self.sock.bind((const_cs.HOST, const_cs.PORT))
-        self.sock.settimeout(3)  # time out in order not to block forever
+        self.sock.listen(self.backlog)  # clients can connect right away, they wait in the backlog until accepted
+        self.sock.setblocking(False)  # never block, the event loop waits until sockets are ready
+        self._selector = selectors.DefaultSelector()
+        self._connections: dict[socket.socket, Connection] = {}
+        self._wakeup_receiver, self._wakeup_sender = socket.socketpair()  # lets stop interrupt the event loop
         self._logger.info("Server bound to socket " + str(self.sock))
 
     def handle_query(self, query_type: QueryType, data: dict[str, Any]) -> Response:
@@ -71,7 +140,6 @@ class Server:
             case "GET":
                 (name,) = require_data(data, "name")
                 lookup_name = str(name).strip()
-                pprint(self.db)
                 self._logger.info(f"Handling GET request for {lookup_name}")
                 number = self.db.get(name)
                 if number is None:
@@ -81,60 +149,146 @@ class Server:
                     "number": number
                 })
             case "GETALL":
-                resp = []
-                for (name, number) in self.db.items():
-                    resp.append({
-                        "name": name,
-                        "number": number
-                    })
-                return response(resp)
+                # entries are generated while the response is sent (in chunks)
+                return response({
+                    "name": name,
+                    "number": number
+                } for (name, number) in self.db.items())
             case _:
                 return {"error": "Invalid query type"}
 
-    def listen(self):
-        # pylint: disable=unused-variable
-        (connection, address) = self.sock.accept()  # returns new socket and address of client
-        while True:  # forever
-            data = connection.recv(1024)  # receive data from client
-            if not data:
-                break  # stop if client stopped
-
-            self._logger.info(f"Received {data.decode("utf-8")} from {address}")
-
+    def accept(self):
+        """ Accept all pending connections """
+        while True:
+            try:
+                (sock, address) = self.sock.accept()  # returns new socket and address of client
+            except BlockingIOError:
+                return  # no more pending connections
+            sock.setblocking(False)
+            connection = Connection(sock, address)
+            self._connections[sock] = connection
+            self._selector.register(sock, selectors.EVENT_READ, connection)
+            self._logger.info(f"Connection accepted from {address}")
+
+    def receive(self, connection: Connection):
+        """ Read request data from a client and answer the complete requests """
+        try:
+            data = connection.sock.recv(4096)  # receive data from client
+        except ConnectionError:
+            data = b''
+        if not data:
+            self.close(connection)  # stop if client stopped
+            return
+
+        connection.incoming += data
+        if len(connection.incoming) > MAX_REQUEST_SIZE and b"\n" not in connection.incoming:
+            self._logger.error(f"Request too long from {connection.address}")
+            self.close(connection)
+            return
+        self.send(connection)
+
+    def answer(self, connection: Connection, request: bytes) -> Iterator[bytes]:
+        """ Handle a request and return the frames of its response """
+        self._logger.info(f"Received {request.decode("utf-8")} from {connection.address}")
+
+        try:
+            (query_type, detail) = parse_query(request)
+            response = self.handle_query(query_type, detail)
+            self._logger.info(f"Sending response to {query_type} query to {connection.address}")
+        except Exception as e:
+            self._logger.error(f"Error handling query: {e}")
+            response = {"error": f"An error occurred: {e}"}
+        return encode_frames(response, self.chunk_size)
+
+    def fill(self, connection: Connection):
+        """ Encode response frames (answering buffered requests in turn) until OUTGOING_LIMIT is reached """
+        while len(connection.outgoing) < OUTGOING_LIMIT:
+            if connection.frames is None:
+                request = connection.next_request()
+                if request is None:
+                    return  # wait for further request data
+                connection.frames = self.answer(connection, request)
+            frame = next(connection.frames, None)
+            if frame is None:
+                connection.frames = None  # response complete
+            else:
+                connection.outgoing += frame
+
+    def send(self, connection: Connection):
+        """ Send as much of the pending response data as the connection takes without blocking """
+        self.fill(connection)
+        while connection.outgoing:
             try:
-                (query_type, detail) = parse_query(data)
-                response = self.handle_query(query_type, detail)
-                connection.send(encode_response(response))
-                self._logger.info(f"Sent {response} to {address}")
-            except Exception as e:
-                self._logger.error(f"Error handling query: {e}")
-                connection.send(encode_response({
-                    "error": f"An error occurred: {e}"
-                }))
-
-        connection.close()  # close the connection
-        self._logger.info(f"Connection closed from {address}")
+                sent = connection.sock.send(connection.outgoing)
+            except BlockingIOError:
+                break  # the client did not take the data sent before yet
+            except ConnectionError:
+                self.close(connection)
+                return
+            del connection.outgoing[:sent]
+            self.fill(connection)
+        # wait until the client took the whole response before reading its next request
+        events = selectors.EVENT_WRITE if connection.outgoing else selectors.EVENT_READ
+        self._selector.modify(connection.sock, events, connection)
+
+    def close(self, connection: Connection):
+        """ Close a client connection """
+        self._selector.unregister(connection.sock)
+        del self._connections[connection.sock]
+        connection.sock.close()  # close the connection
+        self._logger.info(f"Connection closed from {connection.address}")
 
     def serve(self):
-        """ Serve echo """
-        self.sock.listen(1)
+        """ Serve clients until stopped """
+        self._selector.register(self.sock, selectors.EVENT_READ)
+        self._selector.register(self._wakeup_receiver, selectors.EVENT_READ)
         self._logger.info("Server listening")
-        while self._serving:  # as long as _serving (checked after connections or socket timeouts)
-            try:
-                self.listen()
-            except socket.timeout:
-                pass  # ignore timeouts
-            except OSError:
-                pass  # ignore errors due to closed socket
-            except Exception as e:
-                self._logger.error(f"Error in server loop: {e}")
+        while self._serving:  # as long as _serving (checked after events, stop or a timeout)
+            for (key, events) in self._selector.select(timeout=3):
+                try:
+                    if key.fileobj is self.sock:
+                        self.accept()
+                    elif key.fileobj is self._wakeup_receiver:
+                        self._wakeup_receiver.recv(1024)
+                    elif events & selectors.EVENT_WRITE:
+                        self.send(key.data)
+                    else:
+                        self.receive(key.data)
+                except Exception as e:
+                    self._logger.error(f"Error in server loop: {e}")
+        self.shutdown()
+
+    def shutdown(self):
+        """ Stop accepting connections, finish sending pending responses (up to shutdown_timeout) and close all """
+        self._selector.unregister(self.sock)
         self.sock.close()
+        # the wakeup byte of stop is never read, the receiver would keep the drain loop below spinning
+        self._selector.unregister(self._wakeup_receiver)
+        for connection in list(self._connections.values()):
+            connection.incoming.clear()  # answer no further requests
+            if not connection.outgoing:
+                self.close(connection)
+        deadline = time.monotonic() + self.shutdown_timeout
+        while self._connections and time.monotonic() < deadline:
+            for (key, _) in self._selector.select(timeout=deadline - time.monotonic()):
+                if key.fileobj in self._connections:
+                    self.send(key.data)
+                    if key.fileobj in self._connections and not key.data.outgoing:
+                        self.close(key.data)
+        for connection in list(self._connections.values()):
+            self.close(connection)
+        self._selector.close()
+        self._wakeup_receiver.close()
+        self._wakeup_sender.close()
         self._logger.info("Server down")
 
     def stop(self):
-        """ Stop server """
+        """ Stop server (the serving loop shuts down gracefully) """
         self._serving = False
-        self.sock.close()
+        try:
+            self._wakeup_sender.send(b'\0')  # interrupt waiting for events
+        except OSError:
+            pass  # the server is down already
         self._logger.info("Server stopped")
 
 
@@ -145,28 +299,41 @@ class Client:
     def __init__(self):
         self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.sock.connect((const_cs.HOST, const_cs.PORT))
+        self.reader = self.sock.makefile('rb')  # buffered reads of response frames
         self.logger.info("Client connected to socket " + str(self.sock))
 
-    def call(self, query_type: QueryType, data: dict[str, Any] | None = None) -> Response:
-        """ Call server """
+    def stream(self, query_type: QueryType, data: dict[str, Any] | None = None) -> Iterator[Response]:
+        """ Call server and yield the frames of the response as they arrive (GETALL is streamed in chunks) """
         data = data or {}
 
         self.logger.info(f"Calling server with '{query_type}' query and {data}")
 
-        request = encode_request(query_type, data)
-        self.sock.send(request)  # send encoded string as data
-        data = self.sock.recv(1024)  # receive the response
+        self.sock.sendall(encode_request(query_type, data))  # send encoded string as data
+        more = True
+        while more:
+            frame = self.reader.readline()  # receive the next frame of the response
+            if not frame:
+                return  # server closed the connection
 
-        if not data:
-            return {}
+            response = decode_response(frame)
+            more = response.pop("more", False)
+            yield response
 
-        response = decode_response(data)
+    def call(self, query_type: QueryType, data: dict[str, Any] | None = None) -> Response:
+        """ Call server """
+        response = {}
+        for frame in self.stream(query_type, data):
+            if response:
+                response["data"] += frame["data"]  # join the chunks of streamed responses
+            else:
+                response = frame
 
         self.logger.info(f"Received response: {response}")
 
-        return decode_response(data)
+        return response
 
     def close(self):
         """ Close socket """
+        self.reader.close()
         self.sock.close()
         self.logger.info("Client closed socket")
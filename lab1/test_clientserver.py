@@ -2,6 +2,7 @@
 Simple client server unit test
 """
 
+import json
 import logging
 import threading
 import unittest
@@ -16,11 +17,10 @@ big_data_list =    {f'User{i}': f'{i:010d}' for i in range(1000)}
 
 
 class TestDialupServiceLoad(unittest.TestCase):
-    _server = clientserver.Server(big_data_list)  # create single server in class variable
-    _server_thread = threading.Thread(target=_server.serve)  # define thread for running server
-
     @classmethod
     def setUpClass(cls):
+        cls._server = clientserver.Server(big_data_list)  # create single server in class variable
+        cls._server_thread = threading.Thread(target=cls._server.serve)  # define thread for running server
         cls._server_thread.start()  # start server loop in a thread (called only once)
 
     def setUp(self):
@@ -30,20 +30,37 @@ class TestDialupServiceLoad(unittest.TestCase):
     def test_load_getall(self):
         response = self.client.call("GETALL")
         self.assertEqual(response, {
-            "data": big_data_list,
+            "data": [{'name': name, 'number': number} for (name, number) in big_data_list.items()],
         })
 
+    def test_getall_is_streamed_in_chunks(self):
+        frames = list(self.client.stream("GETALL"))
+        self.assertEqual(len(frames), len(big_data_list) // clientserver.CHUNK_SIZE)
+        self.assertTrue(all(len(frame["data"]) == clientserver.CHUNK_SIZE for frame in frames))
+
+    def test_client_can_call_again_after_large_response(self):
+        self.client.call("GETALL")
+        response = self.client.call("GET", {"name": "User7"})
+        self.assertEqual({"data": {'name': 'User7', 'number': '0000000007'}}, response)
+
+    def tearDown(self):
+        self.client.close()  # terminate client after each test
+
+    @classmethod
+    def tearDownClass(cls):
+        cls._server.stop()  # break out of server loop
+        cls._server_thread.join()  # wait for server thread to terminate
+
 
 class TestDialupService(unittest.TestCase):
     """The test"""
-    _server = clientserver.Server({
-        "John Doe": "123456789",
-        "Jane Doe": "1122334455"
-    })  # create single server in class variable
-    _server_thread = threading.Thread(target=_server.serve)  # define thread for running server
-
     @classmethod
     def setUpClass(cls):
+        cls._server = clientserver.Server({
+            "John Doe": "123456789",
+            "Jane Doe": "1122334455"
+        })  # create single server in class variable
+        cls._server_thread = threading.Thread(target=cls._server.serve)  # define thread for running server
         cls._server_thread.start()  # start server loop in a thread (called only once)
 
     def setUp(self):
@@ -79,6 +96,36 @@ class TestDialupService(unittest.TestCase):
             ],
         })
 
+    def test_answers_requests_sent_at_once_in_order(self):
+        requests = [clientserver.encode_request("GET", {"name": name}) for name in ("John Doe", "Jane Doe")]
+        self.client.sock.sendall(b"".join(requests))
+        responses = [json.loads(self.client.reader.readline()) for _ in requests]
+        self.assertEqual([response["data"]["number"] for response in responses], ['123456789', '1122334455'])
+
+    def test_answers_request_split_into_several_packets(self):
+        request = clientserver.encode_request("GET", {"name": "Jane Doe"})
+        self.client.sock.sendall(request[:5])
+        self.client.sock.sendall(request[5:])
+        self.assertEqual(json.loads(self.client.reader.readline()),
+                         {"data": {'name': 'Jane Doe', 'number': '1122334455'}})
+
+    def test_idle_client_does_not_block_others(self):
+        idle_client = clientserver.Client()  # connected, but never sends a request
+        try:
+            response = self.client.call("GET", {"name": "Jane Doe"})
+            self.assertEqual({"data": {'name': 'Jane Doe', 'number': '1122334455'}}, response)
+        finally:
+            idle_client.close()
+
+    def test_serves_many_connected_clients(self):
+        clients = [clientserver.Client() for _ in range(100)]  # all connected at the same time
+        try:
+            for client in clients:
+                response = client.call("GET", {"name": "John Doe"})
+                self.assertEqual({"data": {'name': 'John Doe', 'number': '123456789'}}, response)
+        finally:
+            for client in clients:
+                client.close()
 
     def tearDown(self):
         self.client.close()  # terminate client after each test
@@ -1,10 +1,12 @@
 from context import lab_channel
 import logging
 
+NAMESPACE = 'lab2.channel'  # namespace of the channel keys in redis
+
 
 class Server:
     def __init__(self):
-        self.ci = lab_channel.Channel()
+        self.ci = lab_channel.Channel(namespace=NAMESPACE)
         self.server = self.ci.join('server')
         self.timeout = 3
 
@@ -25,7 +27,7 @@ class Server:
 
 class Client:
     def __init__(self):
-        self.ci = lab_channel.Channel()
+        self.ci = lab_channel.Channel(namespace=NAMESPACE)
         self.client = self.ci.join('client')
         self.server = self.ci.subgroup('server')
 
@@ -6,9 +6,8 @@ from context import lab_channel, lab_logging
 lab_logging.setup(stream_level=logging.DEBUG)
 logger = logging.getLogger('vs2lab.lab2.channel.runsrv')
 
-chan = lab_channel.Channel()
-chan.channel.flushall()
-logger.info('Flushed all redis keys.')
+lab_channel.clear_namespace(channel.NAMESPACE)
+logger.info('Cleared redis keys of the channel.')
 
 server = channel.Server()
 server.run()
@@ -1,3 +1,4 @@
 ACK = '1'
 APPEND = '2'
-RESULT = '3'
\ No newline at end of file
+RESULT = '3'
+NAMESPACE = 'lab2.rpc'  # namespace of the channel keys in redis
@@ -19,7 +19,7 @@ class DBList:
 
 class Client:
     def __init__(self):
-        self.chan = lab_channel.Channel()
+        self.chan = lab_channel.Channel(namespace=constRPC.NAMESPACE)
         self.client = self.chan.join('client')
         self.server = None
 
@@ -48,7 +48,8 @@ class Client:
 
 class Server:
     def __init__(self):
-        self.chan = lab_channel.Channel()
+        # result lists might grow large
+        self.chan = lab_channel.Channel(compression='zlib', namespace=constRPC.NAMESPACE)
         self.server = self.chan.join('server')
         self.timeout = 3
 
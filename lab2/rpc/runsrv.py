@@ -1,14 +1,14 @@
 import logging
 
+import constRPC
 import rpc
 from context import lab_channel, lab_logging
 
 lab_logging.setup(stream_level=logging.INFO)
 logger = logging.getLogger('vs2lab.lab2.rpc.runsrv')
 
-chan = lab_channel.Channel()
-chan.channel.flushall()
-logger.debug('Flushed all redis keys.')
+lab_channel.clear_namespace(constRPC.NAMESPACE)
+logger.debug('Cleared redis keys of the channel.')
 
 srv = rpc.Server()
 srv.run()
@@ -11,6 +11,7 @@ Simple implementation of a chord DHT (distributed hash table)
 import logging
 
 import constChord
+from context import lab_channel
 
 
 class ChordNode:
@@ -120,13 +121,13 @@ class ChordNode:
 
         # Initialize the node
         # Get all nodes from channel for bootstrapping
-        nodes = {node.decode() for node in self.channel.channel.smembers('node')}
+        nodes = self.channel.subgroup('node')
         others = list(nodes - {str(self.node_id)})
         for other_node in others:  # for all other ring nodes
             # register current ring locally (might change later)
             self.add_node(other_node)
             # make this node known to all others
-            self.channel.send_to([other_node], constChord.JOIN)
+            self.channel.send_to([other_node], lab_channel.Routed(constChord.JOIN))
         self.recompute_finger_table()  # initialize local finger table
 
         self.logger.info("ChordNode {:04n} ready.".format(self.node_id))
@@ -135,57 +136,56 @@ class ChordNode:
         while True:  # Start node operation loop
             message = self.channel.receive_from_any()  # Wait for any request
             sender: str = message[0]  # Identify the sender
-            request = message[1]  # And the actual request
+            request = message[1]  # And the actual request (a routed message, the body is decoded on access)
 
             # If sender is a node (that stays in the ring) then update known nodes
-            if request[0] != constChord.LEAVE and self.channel.channel.sismember('node', sender):
+            if request.kind != constChord.LEAVE and sender in self.channel.subgroup('node'):
                 self.add_node(sender)  # remember sender node
 
-            if request[0] == constChord.STOP:  # this node is requested to shutdown
+            if request.kind == constChord.STOP:  # this node is requested to shutdown
                 self.logger.debug("Node {:04n} received STOP from {:04n}."
                                   .format(self.node_id, int(sender)))
                 break
 
-            if request[0] == constChord.LOOKUP_REQ:  # A lookup request
-                self.logger.info("Node {:04n} received LOOKUP {:04n} from {:04n}."
-                                 .format(self.node_id, int(request[1]), int(sender)))
+            if request.kind == constChord.LOOKUP_REQ:  # A lookup request
+                self.logger.info("Node {:04n} received LOOKUP {:04n} from {:04n} after {} hops."
+                                 .format(self.node_id, int(request.body), int(sender), request.hops))
 
-                key = int(request[1])
+                key = int(request.body)
                 succ_node = self.local_successor_node(key)
                 if succ_node == self.node_id:
                     # I am the successor
                     self.logger.info("Node {:04n} is the successor of key {:04n}."
                                      .format(self.node_id, key))
-                    self.channel.send_to([sender],
-                                         (constChord.LOOKUP_REP, str(self.node_id)))
+                    self.channel.send_to([sender], lab_channel.Routed(
+                        constChord.LOOKUP_REP, str(self.node_id), request.correlation_id))
                 else:
-                    # Forward the request to the best known node
+                    # Forward the request to the best known node (passing the body on as it is)
                     self.logger.info("Node {:04n} forwards LOOKUP {:04n} to {:04n}."
                                      .format(self.node_id, key, succ_node))
-                    self.channel.send_to([str(succ_node)],
-                                         (constChord.LOOKUP_REQ, str(key)))
-                    # Wait for the reply
+                    self.channel.send_to([str(succ_node)], request.forward())
+                    # Wait for the reply to this request
                     while True:
-                        response = self.channel.receive_from([str(succ_node)])
-                        if response[1][0] == constChord.LOOKUP_REP:
+                        response = self.channel.receive_from([str(succ_node)])[1]
+                        if response.kind == constChord.LOOKUP_REP and \
+                                response.correlation_id == request.correlation_id:
                             self.logger.info("Node {:04n} received LOOKUP_REP {:04n} from {:04n}."
-                                             .format(self.node_id, int(response[1][1]), int(succ_node)))
+                                             .format(self.node_id, int(response.body), int(succ_node)))
                             # Send the reply back to the original requester
-                            self.channel.send_to([sender],
-                                                 (constChord.LOOKUP_REP, response[1][1]))
+                            self.channel.send_to([sender], response.forward())
                             break
 
                 # Finally do a sanity check
                 if not self.channel.exists(succ_node):  # probe for existence
                     self.delete_node(succ_node)  # purge disappeared node
 
-            elif request[0] == constChord.JOIN:
+            elif request.kind == constChord.JOIN:
                 # Join request (the node was already registered above)
                 self.logger.debug("Node {:04n} received JOIN from {:04n}."
                                   .format(self.node_id, int(sender)))
                 # we don't care for storage re-location in this example
                 continue
-            elif request[0] == constChord.LEAVE:  # Leave request
+            elif request.kind == constChord.LEAVE:  # Leave request
                 self.logger.info("Node {:04n} received LEAVE from {:04n}."
                                  .format(self.node_id, int(sender)))
                 self.delete_node(sender)  # update known nodes
@@ -1,6 +1,6 @@
-LOOKUP_REQ = '1'
-LOOKUP_REP = '2'
-JOIN = '3'
-LEAVE = '4'
-ANNOUNCE = '5'
-STOP = '6'
+LOOKUP_REQ = 1
+LOOKUP_REP = 2
+JOIN = 3
+LEAVE = 4
+ANNOUNCE = 5
+STOP = 6
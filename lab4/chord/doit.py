@@ -8,6 +8,7 @@ Chord Application
 """
 
 import logging
+import os
 import sys
 import multiprocessing as mp
 import random
@@ -30,38 +31,42 @@ class DummyChordClient:
         self.channel.bind(self.node_id)
 
     def run(self):
-        all_nodes = list(self.channel.channel.smembers('node'))
+        all_nodes = list(self.channel.subgroup('node'))
         if not all_nodes:
             print("No nodes in the chord ring.")
             return
 
         key_to_find = random.randrange(0, 2 ** self.channel.n_bits - 1)
-        start_node = random.choice(all_nodes).decode()
+        start_node = random.choice(all_nodes)
 
         print(f"Client {self.node_id} looking up key {key_to_find} starting at node {start_node}")
-        self.channel.send_to([start_node], (constChord.LOOKUP_REQ, str(key_to_find)))
+        request_id = random.getrandbits(64)  # relates the reply to the request
+        self.channel.send_to([start_node], lab_channel.Routed(constChord.LOOKUP_REQ, str(key_to_find), request_id))
         response = self.channel.receive_from([start_node])
-        if response[1][0] == constChord.LOOKUP_REP:
-            found_node = response[1][1]
-            print(f"Key {key_to_find} found at node {found_node}")
+        if response[1].kind == constChord.LOOKUP_REP and response[1].correlation_id == request_id:
+            found_node = response[1].body
+            print(f"Key {key_to_find} found at node {found_node} ({response[1].hops} hops)")
         else:
             print("Unexpected response received.")
-            print(response)
+            print(response[1], response[1].body)
 
         self.channel.send_to(  # a final multicast
-            {i.decode() for i in list(self.channel.channel.smembers('node'))},
-            constChord.STOP)
+            self.channel.subgroup('node'),
+            lab_channel.Routed(constChord.STOP), priority=lab_channel.HIGH_PRIORITY)
 
 
-def create_and_run(num_bits, node_class, enter_bar, run_bar):
+def create_and_run(num_bits, namespace, store, node_class, enter_bar, run_bar):
     """
     Create and run a node (server or client role)
     :param num_bits: address range of the channel
+    :param namespace: namespace of the channel
+    :param store: shared MemoryStore to use instead of redis (or None)
     :param node_class: class of node
     :param enter_bar: barrier syncing channel population 
     :param run_bar: barrier syncing node creation
     """
-    chan = lab_channel.Channel(n_bits=num_bits)
+    chan = lab_channel.Channel(n_bits=num_bits, namespace=namespace, priorities=2,  # lane for STOP
+                               connection=store)
     node = node_class(chan)
     enter_bar.wait()  # wait for all nodes to join the channel
     node.enter()  # do what is needed to enter the ring
@@ -73,17 +78,24 @@ if __name__ == "__main__":  # if script is started from command line
     m = 6  # Number of bits for linear names
     n = 8  # Number of nodes in the chord ring
 
+    # we need to spawn processes for support of windows
+    mp.set_start_method('spawn')
+
+    # Use a store shared by the processes of this host instead of a redis server (option --memory)
+    manager, store = None, None
+    if '--memory' in sys.argv:
+        sys.argv.remove('--memory')
+        manager = lab_channel.MemoryManager()
+        manager.start()
+        store = manager.MemoryStore()
+
     # Check for command line parameters m, n.
     if len(sys.argv) > 2:
         m = int(sys.argv[1])
         n = int(sys.argv[2])
 
-    # Flush communication channel
-    chan = lab_channel.Channel()
-    chan.channel.flushall()
-
-    # we need to spawn processes for support of windows
-    mp.set_start_method('spawn')
+    # Use a channel namespace of its own for this run (instead of flushing the whole redis server)
+    namespace = 'chord:{}'.format(os.getpid())
 
     # create barriers to synchronize bootstrapping
     bar1 = mp.Barrier(n+1)  # Wait for channel population to complete
@@ -95,7 +107,7 @@ if __name__ == "__main__":  # if script is started from command line
         nodeproc = mp.Process(
             target=create_and_run,
             name="ChordNode-" + str(i),
-            args=(m, chord_node.ChordNode, bar1, bar2))
+            args=(m, namespace, store, chord_node.ChordNode, bar1, bar2))
         children.append(nodeproc)
         nodeproc.start()
 
@@ -103,10 +115,16 @@ if __name__ == "__main__":  # if script is started from command line
     clientproc = mp.Process(
         target=create_and_run,
         name="ChordClient",
-        args=(m, DummyChordClient, bar1, bar2))
+        args=(m, namespace, store, DummyChordClient, bar1, bar2))
     clientproc.start()
     clientproc.join()
 
     # wait for node processes to finish
     for nodeproc in children:
         nodeproc.join()
+
+    # Remove the keys of this run (the store of option --memory is gone with its manager)
+    if manager is None:
+        lab_channel.clear_namespace(namespace)
+    else:
+        manager.shutdown()
@@ -7,6 +7,7 @@ Application with a critical section (CS)
 - terminates a random process to simulate a crash fault
 """
 
+import os
 import sys
 import time
 import logging
@@ -23,17 +24,20 @@ lab_logging.setup(stream_level=logging.INFO, file_level=logging.DEBUG)
 logger = logging.getLogger("vs2lab.lab5.mutex.doit")
 
 
-def create_and_run(num_bits, peer_name, peer_type, proc_class, enter_bar, run_bar):
+def create_and_run(num_bits, namespace, store, peer_name, peer_type, proc_class, enter_bar, run_bar):
     """
     Create and run a peer
     :param num_bits: address range of the channel
+    :param namespace: namespace of the channel
+    :param store: shared MemoryStore to use instead of redis (or None)
     :param peer_name: original name of the peer
     :param peer_type: behavior type of the peer
     :param node_class: class of peer
     :param enter_bar: barrier syncing channel population 
     :param run_bar: barrier syncing bootstrap
     """
-    chan = lab_channel.Channel(n_bits=num_bits)
+    chan = lab_channel.Channel(n_bits=num_bits, namespace=namespace, priorities=2,  # lane for heartbeats
+                               connection=store)
     proc = proc_class(chan)
     enter_bar.wait()  # wait for all peers to join the channel
     proc.init(peer_name, peer_type)  # do some bootstrapping
@@ -45,17 +49,24 @@ if __name__ == "__main__":  # if script is started from command line
     m = 8  # Number of bits for process ids
     n = 4  # Number of processes in the group
 
+    # we need to spawn processes for support of windows
+    mp.set_start_method('spawn')
+
+    # Use a store shared by the processes of this host instead of a redis server (option --memory)
+    manager, store = None, None
+    if '--memory' in sys.argv:
+        sys.argv.remove('--memory')
+        manager = lab_channel.MemoryManager()
+        manager.start()
+        store = manager.MemoryStore()
+
     # Check for command line parameters m, n.
     if len(sys.argv) > 2:
         m = int(sys.argv[1])
         n = int(sys.argv[2])
 
-    # Flush communication channel
-    chan = lab_channel.Channel()
-    chan.channel.flushall()
-
-    # we need to spawn processes for support of windows
-    mp.set_start_method('spawn')
+    # Use a channel namespace of its own for this run (instead of flushing the whole redis server)
+    namespace = 'mutex:{}'.format(os.getpid())
 
     # create barriers to synchonize bootstrapping
     bar1 = mp.Barrier(n)  # Wait for channel population to complete
@@ -69,7 +80,7 @@ if __name__ == "__main__":  # if script is started from command line
         peer_proc = mp.Process(
             target=create_and_run,
             name=peer_name,
-            args=(m, peer_name, peer_type, Process, bar1, bar2))
+            args=(m, namespace, store, peer_name, peer_type, Process, bar1, bar2))
         children.append((peer_proc, peer_type))
         logger.info("Starting process {} of type {}.".format(
             peer_proc.name, peer_type))
@@ -91,3 +102,9 @@ if __name__ == "__main__":  # if script is started from command line
     # wait for peer procs to finish
     for peer_proc in children:
         peer_proc[0].join()
+
+    # Remove the keys of this run (the store of option --memory is gone with its manager)
+    if manager is None:
+        lab_channel.clear_namespace(namespace)
+    else:
+        manager.shutdown()
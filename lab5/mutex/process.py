@@ -5,6 +5,7 @@ import time
 
 from constMutex import ENTER, RELEASE, ALLOW, ACTIVE
 from lab5.mutex.constMutex import HEARTBEAT
+from context import lab_channel
 
 HEARTBEAT_TIMEOUT = 10
 HEARTBEAT_INTERVALL = 5
@@ -106,34 +107,11 @@ class Process:
         return first_in_queue and all_have_answered
 
     def __receive(self):
-        # Pick up any message
-        _receive = self.channel.receive_from(self.other_processes, 3)
-        if _receive:
-            msg = _receive[1]
-
-            self.clock = max(self.clock, msg[0])  # Adjust clock value...
-            self.clock = self.clock + 1  # ...and increment
-
-            self.logger.debug("{} received {} from {}.".format(
-                self.__mapid(),
-                "ENTER" if msg[2] == ENTER
-                else "ALLOW" if msg[2] == ALLOW
-                else "RELEASE", self.__mapid(msg[1])))
-
-            if msg[2] == ENTER:
-                self.queue.append(msg)  # Append an ENTER request
-                # and unconditionally allow (don't want to access CS oneself)
-                self.__allow_to_enter(msg[1])
-            elif msg[2] == ALLOW:
-                self.queue.append(msg)  # Append an ALLOW
-            elif msg[2] == RELEASE:
-                if len(self.queue) != 0:
-                    # assure release requester indeed has access (his ENTER is first in queue)
-                    assert self.queue[0][1] == msg[1] and self.queue[0][2] == ENTER, 'State error: inconsistent remote RELEASE'
-                    del (self.queue[0])  # Just remove first message
-
-            self.__receive_heartbeat(msg)
-            self.__cleanup_queue()  # Finally sort and cleanup the queue
+        # Pick up any messages (block for the first one, then take all that are waiting)
+        _received = self.channel.receive_many(self.other_processes, timeout=3)
+        if _received:
+            for _, msg in _received:
+                self.__handle(msg)
         else:
             self.logger.info("{} timed out on RECEIVE. Local queue: {}".
                              format(self.__mapid(),
@@ -142,6 +120,31 @@ class Process:
                                         self.__mapid(msg[1]),
                                         msg[2]), self.queue))))
 
+    def __handle(self, msg):
+        self.clock = max(self.clock, msg[0])  # Adjust clock value...
+        self.clock = self.clock + 1  # ...and increment
+
+        self.logger.debug("{} received {} from {}.".format(
+            self.__mapid(),
+            "ENTER" if msg[2] == ENTER
+            else "ALLOW" if msg[2] == ALLOW
+            else "RELEASE", self.__mapid(msg[1])))
+
+        if msg[2] == ENTER:
+            self.queue.append(msg)  # Append an ENTER request
+            # and unconditionally allow (don't want to access CS oneself)
+            self.__allow_to_enter(msg[1])
+        elif msg[2] == ALLOW:
+            self.queue.append(msg)  # Append an ALLOW
+        elif msg[2] == RELEASE:
+            if len(self.queue) != 0:
+                # assure release requester indeed has access (his ENTER is first in queue)
+                assert self.queue[0][1] == msg[1] and self.queue[0][2] == ENTER, 'State error: inconsistent remote RELEASE'
+                del (self.queue[0])  # Just remove first message
+
+        self.__receive_heartbeat(msg)
+        self.__cleanup_queue()  # Finally sort and cleanup the queue
+
     def init(self, peer_name, peer_type):
         self.channel.bind(self.process_id)
 
@@ -165,7 +168,9 @@ class Process:
         while True:
             # last_heartbeat_delta = time.time() - self.last_message_sent
             # if last_heartbeat_delta > HEARTBEAT_TIMEOUT:
-            self.channel.send_to(self.other_processes, (self.clock, self.process_id, HEARTBEAT))
+            # heartbeats overtake queued protocol messages, so failure detection does not lag behind under load
+            self.channel.send_to(self.other_processes, (self.clock, self.process_id, HEARTBEAT),
+                                 priority=lab_channel.HIGH_PRIORITY)
             time.sleep(HEARTBEAT_INTERVALL)
 
 
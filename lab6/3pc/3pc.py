@@ -9,6 +9,8 @@ Application performing a distributed commit
 
 import multiprocessing as mp
 import logging
+import os
+import sys
 
 import coordinator
 import participant
@@ -19,15 +21,17 @@ lab_logging.setup(stream_level=logging.INFO, file_level=logging.DEBUG)
 logger = logging.getLogger("vs2lab.lab6.3pc.3pc")
 
 
-def create_and_run(num_bits, proc_class, enter_bar, run_bar):
+def create_and_run(num_bits, namespace, store, proc_class, enter_bar, run_bar):
     """
     Create and run a participant
     :param num_bits: address range of the channel
+    :param namespace: namespace of the channel
+    :param store: shared MemoryStore to use instead of redis (or None)
     :param node_class: class of participant
     :param enter_bar: barrier syncing channel population
     :param run_bar: barrier syncing bootstrap
     """
-    chan = lab_channel.Channel(n_bits=num_bits)
+    chan = lab_channel.Channel(n_bits=num_bits, namespace=namespace, connection=store)
     proc = proc_class(chan)
     enter_bar.wait()  # wait for all participants to join the channel
     proc.init()  # do some bootstrapping
@@ -39,13 +43,20 @@ if __name__ == "__main__":  # if script is started from command line
     m = 8  # Number of bits for process ids
     n = 2  # Number of participants in the group
 
-    # Flush communication channel
-    chan = lab_channel.Channel()
-    chan.channel.flushall()
+    # Use a channel namespace of its own for this run (instead of flushing the whole redis server)
+    namespace = '3pc:{}'.format(os.getpid())
 
     # we need to spawn processes for support of windows
     mp.set_start_method('spawn')
 
+    # Use a store shared by the processes of this host instead of a redis server (option --memory)
+    manager, store = None, None
+    if '--memory' in sys.argv:
+        sys.argv.remove('--memory')
+        manager = lab_channel.MemoryManager()
+        manager.start()
+        store = manager.MemoryStore()
+
     # create barriers to synchonize bootstrapping
     bar1 = mp.Barrier(n+1)  # Wait for channel population to complete
     bar2 = mp.Barrier(n+1)  # Wait for process-group init to complete
@@ -56,7 +67,7 @@ if __name__ == "__main__":  # if script is started from command line
         participant_proc = mp.Process(
             target=create_and_run,
             name="Participant-" + str(i),
-            args=(m, participant.Participant, bar1, bar2))
+            args=(m, namespace, store, participant.Participant, bar1, bar2))
         participants.append(participant_proc)
         participant_proc.start()
 
@@ -64,7 +75,7 @@ if __name__ == "__main__":  # if script is started from command line
     coordinator_proc = mp.Process(
         target=create_and_run,
         name="Coordinator",
-        args=(m, coordinator.Coordinator, bar1, bar2))
+        args=(m, namespace, store, coordinator.Coordinator, bar1, bar2))
     coordinator_proc.start()
 
     # wait for coordinator to finish
@@ -73,3 +84,9 @@ if __name__ == "__main__":  # if script is started from command line
     # wait for participants to finish
     for participant_proc in participants:
         participant_proc.join()
+
+    # Remove the keys of this run (the store of option --memory is gone with its manager)
+    if manager is None:
+        lab_channel.clear_namespace(namespace)
+    else:
+        manager.shutdown()
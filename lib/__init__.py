@@ -1 +1 @@
-__all__ = ['lab_channel.py', 'lab_logging.py']
+__all__ = ['lab_channel.py', 'lab_codec.py', 'lab_logging.py', 'lab_memory.py', 'lab_stats.py', 'lab_zmq.py']
@@ -1,20 +1,572 @@
+import ast
+import asyncio
+import bisect
+import contextvars
+import copy
+import hashlib
 import logging
 import os
-import pickle
 import random
+import re
+import struct
+import threading
+import time
+import uuid
+import weakref
+from multiprocessing import shared_memory
 from typing import Any
 
 import redis
+import redis.asyncio
 
+from . import lab_codec
+from .lab_codec import Codec, PickleCodec, Pickle5Codec, MsgpackCodec, RawCodec  # pylint: disable=unused-import
+from .lab_memory import MemoryStore, MemoryManager  # pylint: disable=unused-import
+from .lab_stats import ChannelStats, dump_periodically
 
-class Channel:
+# Pub/sub topic announcing changes of the member set or any subgroup set
+MEMBERSHIP_TOPIC = 'membership'
+# Envelope header preceding every message: flags, length of the sender id (followed by sender id and body)
+_ENVELOPE_HEADER = struct.Struct('!BB')
+# Envelope flag bits holding the id of the compression algorithm of the body (0 if uncompressed)
+COMPRESSION_MASK = 0x03
+# Envelope flag marking a reference to an envelope stored once for all receivers (body holds its key)
+REFERENCE_FLAG = 0x04
+# Envelope flag marking a routing header in front of the body (see Routed) and the layout of the header
+ROUTED_FLAG = 0x08
+_ROUTING_HEADER = struct.Struct('!HQB')
+# Envelope flag marking a handle of an envelope in a shared memory segment (body holds its size and name)
+SHARED_FLAG = 0x10
+_SHARED_HANDLE = struct.Struct('!Q')
+# Envelope flag marking the expiry time of a message after the sender id (milliseconds since the epoch)
+EXPIRY_FLAG = 0x20
+_EXPIRY = struct.Struct('!Q')
+# Consumer group reading the queues in streams mode (each queue has a single consumer, its receiver)
+STREAM_GROUP = 'channel'
+# Number of points per shard on the consistent hash ring (more points spread receivers more evenly)
+SHARD_REPLICAS = 64
+# Policies for messages to full queues (bounded queues only): wait for the receiver, trim the oldest message,
+# discard the new message or raise QueueFullError
+OVERFLOW_POLICIES = ('block', 'drop_oldest', 'drop_newest', 'raise')
+# Longest pause (in seconds) between two checks of a full queue by a blocked sender
+BLOCK_POLL_MAX = 0.1
+# Priorities of messages (lanes of a queue), receivers drain the lanes of higher priority first
+NORMAL_PRIORITY = 0
+HIGH_PRIORITY = 1
+# Number of random member ids to probe before unused ids are computed from the member set
+CLAIM_PROBES = 16
+
+# connection pools shared by all channels and clients of the process, by client module, event loop and address
+_pools: dict[tuple, redis.ConnectionPool | redis.asyncio.ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def _reset_pools() -> None:
+    """ Forget the pools inherited by a forked child process (their connections belong to the parent) """
+    global _pools_lock
+    _pools.clear()
+    # the lock might have been held by another thread of the parent at fork time
+    _pools_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_pools)
+
+# channels of the process (reset in a forked child process, see Channel._after_fork)
+_channels: weakref.WeakSet = weakref.WeakSet()
+
+
+def _reset_channels() -> None:
+    """ Reset the process-local state of the channels inherited by a forked child process """
+    for channel in list(_channels):
+        channel._after_fork()  # pylint: disable=protected-access
+
+
+os.register_at_fork(after_in_child=_reset_channels)
+
+
+def _pool(module, loop, host_ip: str, port_no: int, unix_socket_path: str | None):
+    """
+    Look up (or create) the shared connection pool of the process for a redis server.
+    :param module: client module (redis or redis.asyncio)
+    :param loop: event loop of asyncio pools (connections can not be shared across loops) or None
+    :param host_ip: host of the redis server
+    :param port_no: port of the redis server
+    :param unix_socket_path: path of the unix domain socket of the redis server (replaces host and port)
+    :return: connection pool
+    """
+    address: tuple = (unix_socket_path,) if unix_socket_path else (host_ip, port_no)
+    with _pools_lock:
+        # forget the pools of event loops closed in the meantime (their connections can not be used anymore)
+        for key in [key for key in _pools if key[1] is not None and key[1].is_closed()]:
+            del _pools[key]
+        pool = _pools.get((module.__name__, loop) + address)
+        if pool is None:
+            if unix_socket_path:
+                pool = module.ConnectionPool(connection_class=module.UnixDomainSocketConnection,
+                                             path=unix_socket_path, db=0)
+            else:
+                pool = module.ConnectionPool(host=host_ip, port=port_no, db=0)
+            _pools[(module.__name__, loop) + address] = pool
+        return pool
+
+
+def connect(host_ip: str = 'localhost', port_no: int = 6379, unix_socket_path: str | None = None) -> redis.StrictRedis:
+    """
+    Create a redis client on the connection pool the process shares for a redis server.
+    Clients are cheap, connections are opened by the pool on demand and reused by all clients of the process.
+    :param host_ip: host of the redis server
+    :param port_no: port of the redis server
+    :param unix_socket_path: path of the unix domain socket of the redis server (replaces host and port)
+    :return: redis client
+    """
+    return redis.StrictRedis(connection_pool=_pool(redis, None, host_ip, port_no, unix_socket_path))
+
+
+def _connection(spec):
+    """ Turn a (host, port) tuple or unix socket path into a client, other connections are used as they are """
+    if isinstance(spec, tuple):
+        return connect(*spec)
+    if isinstance(spec, str):
+        return connect(unix_socket_path=spec)
+    return spec
+
+
+def _spec(connection):
+    """ Turn a redis client back into a (host, port) tuple or unix socket path (inverse of _connection) """
+    if isinstance(connection, redis.Redis):
+        kwargs: dict = connection.connection_pool.connection_kwargs
+        return kwargs['path'] if 'path' in kwargs else (kwargs.get('host', 'localhost'), kwargs.get('port', 6379))
+    return connection
+
+
+def _glob_escape(text: str) -> str:
+    """ Escape the characters of a text that have a special meaning in redis key patterns """
+    return re.sub(r'([\[\]*?\\])', r'\\\1', text)
+
+
+def clear_namespace(namespace: str, connection=None, batch_size: int = 1000) -> int:
+    """
+    Delete all keys of a channel namespace, e.g. after an experiment finished (instead of flushing the whole server).
+    Keys are collected incrementally with SCAN and deleted in batches with (non-blocking) UNLINK,
+    so a redis server shared with other experiments stays responsive. Sharded channels need to clear every shard.
+    :param namespace: namespace of the channel (the default namespace can not be cleared)
+    :param connection: redis client (or MemoryStore) or None for the default redis server
+    :param batch_size: number of keys per SCAN step and UNLINK call
+    :return: number of deleted keys
+    """
+    assert namespace, 'the default namespace can not be cleared'
+    connection = connection if connection is not None else connect()
+    pattern: str = _glob_escape(namespace) + ':*'
+    deleted: int = 0
+    batch: list = []
+    for key in connection.scan_iter(match=pattern, count=batch_size):
+        batch.append(key)
+        if len(batch) >= batch_size:
+            deleted += connection.unlink(*batch)
+            batch = []
+    if batch:
+        deleted += connection.unlink(*batch)
+    return deleted
+
+
+class QueueFullError(Exception):
+    """ Raised by send operations on channels with bounded queues and overflow policy 'raise' """
+
+
+class Routed:
+    """
+    Message with a small routing header (kind, correlation id and hop count) in front of its body.
+    Receivers get the header without deserializing the body, which is only decoded on first access of body.
+    Forwarding a received message (see forward) passes its serialized body on as it is, so routers inspecting
+    the header neither deserialize nor re-serialize bodies.
+    """
+
+    def __init__(self, kind: int, body: Any = None, correlation_id: int = 0, hops: int = 0):
+        """
+        :param kind: message type (unsigned 16-bit integer)
+        :param body: message object (serialized by the codec of the channel)
+        :param correlation_id: id relating replies to requests (unsigned 64-bit integer)
+        :param hops: number of times the message was forwarded (at most 255)
+        """
+        self.kind: int = kind
+        self.correlation_id: int = correlation_id
+        self.hops: int = hops
+        self.__body: Any = body
+        # serialized body, its compression id and the codec to decode it (only for received messages)
+        self._raw = None
+        self._compression_id: int = 0
+        self.__codec: Codec | None = None
+
+    @classmethod
+    def _received(cls, header, raw, compression_id: int, codec: Codec) -> 'Routed':
+        """
+        Create a received message whose body is decoded on demand.
+        :param header: tuple of kind, correlation id and hops
+        :param raw: serialized body (any bytes-like object)
+        :param compression_id: id of the compression algorithm of the body (0 if uncompressed)
+        :param codec: codec to decode the body with
+        :return: routed message
+        """
+        routed = cls(header[0], correlation_id=header[1], hops=header[2])
+        routed._raw, routed._compression_id, routed.__codec = raw, compression_id, codec
+        return routed
+
+    def __repr__(self) -> str:
+        return 'Routed(kind={}, correlation_id={}, hops={})'.format(self.kind, self.correlation_id, self.hops)
+
+    @property
+    def body(self) -> Any:
+        """ The message object (deserialized on first access) """
+        if self.__codec is not None:
+            raw = self._raw
+            if self._compression_id:
+                raw = lab_codec.decompress(raw, self._compression_id)
+            self.__body, self.__codec = self.__codec.decode(raw), None
+        return self.__body
+
+    def forward(self) -> 'Routed':
+        """
+        Create a copy of the message for passing it on (one hop more), keeping the serialized body of a
+        received message.
+        :return: routed message
+        """
+        assert self.hops < 255, 'hop limit exceeded'
+        routed: Routed = copy.copy(self)
+        routed.hops += 1
+        return routed
+
+
+# member handle in use by the current thread or asyncio task as tuple of channel and member id (see Member)
+_current_member: contextvars.ContextVar = contextvars.ContextVar('current_member', default=None)
+
+
+def _unlink_segment(name: str) -> None:
+    """ Unlink a shared memory segment (if it still exists) """
+    try:
+        segment = shared_memory.SharedMemory(name=name, track=False)
+    except FileNotFoundError:
+        return
+    segment.close()
+    segment.unlink()
+
+
+def _ring_hash(key: str) -> int:
+    """ Hash a key to a position on the consistent hash ring (stable across processes, unlike hash) """
+    return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], 'big')
+
+
+class _ChannelBase:
+    """
+    State and I/O-free parts shared by Channel and AsyncChannel:
+    member bindings, local membership views, queue naming, envelopes and the local inbox buffer.
+    """
+
+    def __init__(self, n_bits: int, inbox: bool, codec: Codec | None, compression: str | None,
+                 compress_threshold: int, namespace: str, priorities: int = 1):
+        # create dict of local pid bindings
+        self.os_members = {}
+        # prefix of all redis keys and pub/sub topics of the channel (empty for the default namespace)
+        self.namespace: str = namespace
+        # Number of bits for pid addresses
+        self.n_bits: int = n_bits
+        # Maximum corresponding pid
+        self.MAXPROC: int = pow(2, n_bits)
+        # local views of the global member set and subgroup sets (None/missing if invalidated)
+        self._members: set | None = None
+        self._subgroups: dict[str, set] = {}
+        # number of invalidations so far (views read before an invalidation must not be stored after it)
+        self._membership_generation: int = 0
+        # serializer for message objects (all members have to use the same kind of codec)
+        self.codec: Codec = codec or PickleCodec()
+        # compression algorithm for large message bodies (None, 'zlib', 'lzma' or 'lz4') and minimum body size
+        assert compression is None or compression in lab_codec.COMPRESSION_IDS, 'unknown compression'
+        self.compression: str | None = compression
+        self.compress_threshold: int = compress_threshold
+        # use a single inbox queue per receiver instead of sender-receiver queues
+        self.inbox: bool = inbox
+        # number of priority lanes per queue (all members have to use the same number)
+        assert priorities > 0, 'at least one priority lane is needed'
+        self.priorities: int = priorities
+        # messages taken off the queues but not yet consumed by a matching receive call per receiver
+        # as tuples of sender id, message and acknowledgement token (streams mode, None otherwise)
+        self._pending: dict[str, list[tuple[str, Any, Any]]] = {}
+        # acknowledgement tokens of messages handed out but not yet acknowledged per receiver (streams mode)
+        self._unacked: dict[str, list] = {}
+        # number of envelope bytes decoded so far per receiver (for statistics)
+        self._received_bytes: dict[str, int] = {}
+        # create instance logger
+        self.logger = logging.getLogger('vs2lab.channel.' + type(self).__name__)
+        self.logger.debug('New {} created.'.format(type(self).__name__))
+
+    @staticmethod
+    def _decode_set(raw) -> set:
+        return {i.decode() for i in raw}
+
+    def _invalidate_membership(self, notification=None) -> None:
+        """
+        Drop local views of the member set and all subgroup sets.
+        :param notification: pub/sub message that triggered the invalidation (unused)
+        :return: None
+        """
+        self._membership_generation += 1
+        self._members = None
+        self._subgroups = {}
+
+    def bind(self, pid: str) -> int:
+        """
+        Associate os pid with channel member id.
+        Thus a caller does not need to provide its id for every subsequent call.
+        :param pid: identifier of process member
+        :return: os pid value
+        """
+        # retrieve os pid and map to given member id
+        os_pid: int = os.getpid()
+        self.os_members[os_pid] = pid
+        self.logger.debug("Member {} bound {}".format(pid, os_pid))
+        return os_pid
+
+    def _caller(self, required: bool = True) -> str | None:
+        """
+        Identify the calling member: the member of the handle in use by the current thread or asyncio task
+        (see member), otherwise the member bound to the os pid.
+        :param required: assert that the caller is a member
+        :return: member id or None if the caller is not a member (and not required to be one)
+        """
+        current = _current_member.get()
+        if current is not None and current[0] is self:
+            return current[1]
+        caller: str | None = self.os_members.get(os.getpid())
+        assert caller is not None or not required, 'caller is neither bound nor using a member handle'
+        return caller
+
+    def _forget(self, pid: str) -> None:
+        """
+        Drop the os pid binding (if bound) and the local buffers of a leaving member.
+        :param pid: member id
+        :return: None
+        """
+        if self.os_members.get(os.getpid()) == pid:
+            del self.os_members[os.getpid()]
+        self._pending.pop(pid, None)
+        self._unacked.pop(pid, None)
+
+    def _key(self, name: str) -> str:
+        """
+        Construct the redis key (or pub/sub topic) of a name in the namespace of the channel.
+        :param name: key name
+        :return: redis key
+        """
+        return self.namespace + ':' + name if self.namespace else name
+
+    def _queue_key(self, sender: str, receiver: str, priority: int = NORMAL_PRIORITY) -> str:
+        """
+        Construct queue name from sender and receiver ids (and the priority of lanes other than the normal one).
+        :param sender: member identifier
+        :param receiver: member identifier
+        :param priority: priority lane
+        :return: redis key
+        """
+        return self._key(str([sender, receiver] if priority == NORMAL_PRIORITY else [sender, receiver, priority]))
+
+    def _queue_keys(self, pid: str, others: set) -> list[str]:
+        """
+        Construct names of all queues between a member and a set of other members (both directions).
+        :param pid: member identifier
+        :param others: set of member identifiers
+        :return: list of redis keys
+        """
+        return [self._queue_key(pid, other) for other in others] + [self._queue_key(other, pid) for other in others]
+
+    def _inbox_key(self, receiver: str, priority: int = NORMAL_PRIORITY) -> str:
+        """
+        Construct inbox queue name of a receiver (inbox mode).
+        :param receiver: member identifier
+        :param priority: priority lane
+        :return: redis key
+        """
+        if priority != NORMAL_PRIORITY:
+            return self._key('inbox:{}:{}'.format(receiver, priority))
+        return self._key('inbox:' + receiver)
+
+    def _out_key(self, sender: str, receiver: str, priority: int = NORMAL_PRIORITY) -> str:
+        """
+        Construct name of the queue messages from sender to receiver are pushed to (depending on the mode).
+        :param sender: member identifier
+        :param receiver: member identifier
+        :param priority: priority lane
+        :return: redis key
+        """
+        return self._inbox_key(receiver, priority) if self.inbox else self._queue_key(sender, receiver, priority)
+
+    def _in_keys(self, receiver: str, senders) -> list[str]:
+        """
+        Construct names of all incoming queues of a receiver, the lanes of higher priority first
+        (blocking and multi-key pops take from the first non-empty key).
+        :param receiver: member identifier
+        :param senders: iterable of sender ids (unused in inbox mode)
+        :return: list of redis keys
+        """
+        lanes = range(self.priorities - 1, -1, -1)
+        if self.inbox:
+            return [self._inbox_key(receiver, priority) for priority in lanes]
+        return [self._queue_key(sender, receiver, priority) for priority in lanes for sender in senders]
+
+    def _encode(self, sender: str, message: object, expires: int | None = None) -> bytes:
+        """
+        Serialize a message and wrap it in an envelope carrying the sender id (and the expiry time).
+        Bodies of at least compress_threshold bytes are compressed if compression is enabled.
+        :param sender: member identifier
+        :param message: the message object
+        :param expires: optional expiry time of the message in milliseconds since the epoch
+        :return: envelope bytes
+        """
+        flags: int = 0
+        expiry: bytes = b''
+        header: bytes = b''
+        raw_sender: bytes = sender.encode()
+        if expires is not None:
+            flags, expiry = EXPIRY_FLAG, _EXPIRY.pack(expires)
+        if isinstance(message, Routed):
+            flags |= ROUTED_FLAG
+            header = _ROUTING_HEADER.pack(message.kind, message.correlation_id, message.hops)
+            if message._raw is not None:
+                # pass the body of a received message on as it is
+                flags |= message._compression_id
+                return b''.join([_ENVELOPE_HEADER.pack(flags, len(raw_sender)), raw_sender, expiry, header,
+                                 message._raw])
+            message = message.body
+        body = self.codec.encode(message)
+        if self.compression is not None and len(body) >= self.compress_threshold:
+            body = lab_codec.compress(body, self.compression)
+            flags |= lab_codec.COMPRESSION_IDS[self.compression]
+        return b''.join([_ENVELOPE_HEADER.pack(flags, len(raw_sender)), raw_sender, expiry, header, body])
+
+    def _encode_reference(self, sender: str, key: str) -> bytes:
+        """
+        Wrap the key of a stored envelope in a reference envelope.
+        :param sender: member identifier
+        :param key: redis key of the stored envelope
+        :return: envelope bytes
+        """
+        raw_sender: bytes = sender.encode()
+        return b''.join([_ENVELOPE_HEADER.pack(REFERENCE_FLAG, len(raw_sender)), raw_sender, key.encode()])
+
+    def _encode_shared(self, sender: str, name: str, size: int) -> bytes:
+        """
+        Wrap the handle of a shared memory segment holding an envelope in an envelope.
+        :param sender: member identifier
+        :param name: name of the segment
+        :param size: size of the envelope in the segment
+        :return: envelope bytes
+        """
+        raw_sender: bytes = sender.encode()
+        return b''.join([_ENVELOPE_HEADER.pack(SHARED_FLAG, len(raw_sender)), raw_sender,
+                         _SHARED_HANDLE.pack(size), name.encode()])
+
+    @staticmethod
+    def _header(envelope: bytes) -> tuple[int, str, int]:
+        """
+        Unpack the header of an envelope.
+        :param envelope: envelope bytes
+        :return: tuple of flags, sender id and offset of the rest of the envelope
+        """
+        flags, sender_len = _ENVELOPE_HEADER.unpack_from(envelope)
+        offset: int = _ENVELOPE_HEADER.size
+        return flags, bytes(envelope[offset:offset + sender_len]).decode(), offset + sender_len
+
+    def _decode(self, caller: str, envelope: bytes) -> tuple[str, Any] | None:
+        """
+        Unwrap an envelope and deserialize the message it contains.
+        References to stored envelopes and shared memory segments have to be resolved by the subclass.
+        :param caller: receiver id
+        :param envelope: envelope bytes
+        :return: tuple of sender id and message object or None if the message expired
+        """
+        flags, sender, offset = self._header(envelope)
+        assert not flags & (REFERENCE_FLAG | SHARED_FLAG), 'unresolved envelope'
+        self._received_bytes[caller] = self._received_bytes.get(caller, 0) + len(envelope)
+        if flags & EXPIRY_FLAG:
+            (expires,) = _EXPIRY.unpack_from(envelope, offset)
+            if time.time() * 1000 > expires:
+                return None
+            offset += _EXPIRY.size
+        # a view on the envelope, so the body is not copied before decoding
+        body = memoryview(envelope)[offset:]
+        if flags & ROUTED_FLAG:
+            # only unpack the routing header, the body is decoded when accessed
+            header = _ROUTING_HEADER.unpack_from(body)
+            return sender, Routed._received(header, body[_ROUTING_HEADER.size:], flags & COMPRESSION_MASK, self.codec)
+        if flags & COMPRESSION_MASK:
+            body = lab_codec.decompress(body, flags & COMPRESSION_MASK)
+        return sender, self.codec.decode(body)
+
+    def _decode_all(self, caller: str, envelopes: list) -> list[tuple[str, Any]]:
+        """
+        Decode envelopes taken off the queues, dropping expired messages.
+        :param caller: receiver id
+        :param envelopes: list of envelope bytes
+        :return: list of tuples of sender id and message
+        """
+        decoded: list = [self._decode(caller, envelope) for envelope in envelopes]
+        return [message for message in decoded if message is not None]
+
+    def _take_pending(self, caller: str, sender_set: set | None, max_messages: int) -> list[tuple[str, Any]]:
+        """
+        Take up to max_messages buffered messages from the senders off the local buffer of the caller.
+        :param caller: receiver id
+        :param sender_set: set of sender ids or None for any sender
+        :param max_messages: maximum number of messages to return
+        :return: list of tuples of sender id and message (in order of arrival)
+        """
+        pending: list = self._pending.get(caller, [])
+        taken: list = [m for m in pending if sender_set is None or m[0] in sender_set][:max_messages]
+        for m in taken:
+            pending.remove(m)
+            if m[2] is not None:
+                self._unacked.setdefault(caller, []).append(m[2])
+        return [(sender, message) for sender, message, _ in taken]
+
+    def _filter(self, caller: str, sender_set: set | None, envelopes: list, tokens: list | None = None,
+                limit: int | None = None) -> list[tuple[str, Any]]:
+        """
+        Decode envelopes taken off the queues and keep messages of other senders (or beyond the limit)
+        in the local buffer of the caller.
+        :param caller: receiver id
+        :param sender_set: set of sender ids or None for any sender
+        :param envelopes: list of envelope bytes
+        :param tokens: optional list of acknowledgement tokens of the envelopes (streams mode)
+        :param limit: optional maximum number of messages to return
+        :return: list of tuples of sender id and message from the senders
+        """
+        messages: list = []
+        for i, envelope in enumerate(envelopes):
+            token = tokens[i] if tokens is not None else None
+            decoded = self._decode(caller, envelope)
+            if decoded is None:
+                # drop expired messages (but acknowledge them)
+                if token is not None:
+                    self._unacked.setdefault(caller, []).append(token)
+                continue
+            sender, message = decoded
+            if (sender_set is None or sender in sender_set) and (limit is None or len(messages) < limit):
+                messages.append((sender, message))
+                if token is not None:
+                    self._unacked.setdefault(caller, []).append(token)
+            else:
+                # keep messages of other senders for later receive calls
+                self._pending.setdefault(caller, []).append((sender, message, token))
+        return messages
+
+
+class Channel(_ChannelBase):
     """
     Channel implements a communication channel for persistent asynchronous message exchange between member processes.
     Member processes (short: members) have to explicitly join a common global channel and obtain an identifier.
     Processes are associated with "subgroups" that can be queried to obtain a set of all members (e.g. all "servers").
 
     Members can use the channel to send/receive a message to/from a set of members or all other members.
-    Messages might be any serializable object.
+    Messages might be any object serializable by the codec of the channel (any picklable object by default,
+    see lab_codec for alternatives like out-of-band pickle buffers, msgpack or raw bytes).
 
     Internally, the channel manages a set of queues.
     A queue is associates with two channel members: a sender and a receiver.
@@ -26,6 +578,10 @@ class Channel:
     The key is a string representation of a list containing sender and receiver ids.
     That is, sender and receiver can always be identified by parsing the queue keys.
 
+    Channels created with a namespace prefix all of their keys (and the pub/sub topic) with "<namespace>:",
+    so several experiments can share a redis server and be cleaned up separately (see clear_namespace).
+    The key names below are those of the default (empty) namespace.
+
     Redis data Structures:
 
     Global Member Set
@@ -34,109 +590,414 @@ class Channel:
     Subgroup Member Sets
         Key: <subgroup>
         Value: redis set of member ID strings
-    Global Queue List (containing all possible queue keys)
+    Global Queue Set (containing all possible queue keys)
         Key: "xchan"
-        Value: redis list of queue identifier objects
+        Value: redis set of queue keys
     Queues
         Key: "['<member1>','<member2>']"
-        Value: redis list of message objects send fom member1 to member2
+        Value: redis list of message envelopes send fom member1 to member2
+
+    Envelopes:
+
+    Each message is serialized by the codec of the channel and wrapped in an envelope consisting of
+    a flags byte, the length of the sender id, the sender id and the serialized message (body).
+    Messages of channels with a ttl carry their expiry time between sender id and body.
+    Channels with compression enabled compress bodies above a size threshold and mark the algorithm
+    in the flags, so receivers decompress them transparently (regardless of their own settings).
+    Routed messages (see Routed) add a fixed routing header (kind, correlation id, hops) between
+    sender id and body and are received as Routed objects decoding their bodies lazily, so routers
+    can dispatch or forward them without deserializing the body.
+
+    Inbox Mode:
+
+    Channels created with inbox=True use a single queue per receiver instead of sender-receiver queues.
+    As each envelope carries the sender id, receiving from any sender is a blocking read on one key
+    regardless of the group size. Selective receive operations move messages of other senders to a
+    local buffer (of the receiver) that is served first by its subsequent receive calls. All members of a
+    channel have to agree on the mode. Receive calls of the same member on an inbox channel should not be
+    issued concurrently from several threads, as messages buffered by one thread are not seen by a blocked one.
+
+    Inboxes
+        Key: "inbox:<member>"
+        Value: redis list of message envelopes send to member
+
+    Member Handles:
+
+    Operations act on behalf of the member bound to the os pid (see bind), i.e. one member per process.
+    A handle returned by member(pid) acts on behalf of the given member instead, so a single process
+    (and channel) can host many members, e.g. one per thread. Each member has its own local buffer and
+    acknowledgements. The member of a handle only applies while the handle's operation runs in the calling
+    thread (or asyncio task for AsyncChannel), so handles of different members can be used concurrently.
+
+    Membership Caching:
+
+    Each channel keeps a process-local view of the member set and of all subgroup sets queried so far.
+    Members joining or leaving publish a notification on the MEMBERSHIP_TOPIC pub/sub channel,
+    which invalidates the local views of all channels. Send and receive operations validate ids
+    against the local view and only re-read the member set from redis if an id is not found there
+    (e.g. a member that joined before the notification arrived). A set read while a notification
+    arrives is used once but not kept as view. If the notification connection fails, the views are
+    dropped and the channel subscribes again on the next use.
+
+    In-Memory Backend:
+
+    Instead of a redis client, a channel can use a MemoryStore (see lab_memory) as connection.
+    A MemoryStore keeps all data structures in process memory, a MemoryStore served by a MemoryManager
+    is shared by all processes of a host (e.g. the processes spawned by the doit.py launchers).
+    No redis server is needed then. Membership views are not cached for memory stores, as reading
+    them does not take a network round trip.
+
+    Streams Mode:
+
+    Channels created with streams=True store queues (or inboxes) as redis streams instead of lists.
+    Messages are appended with XADD, optionally trimmed to about max_stream_length entries (trimming
+    drops the oldest entries, even if they were not read yet). Receivers read through a consumer group
+    (XREADGROUP), which returns whole batches across all incoming streams in one round trip.
+    Messages stay pending until they are acknowledged, which happens when the receiver issues its next
+    receive call or calls ack. Messages of a receiver that crashed while handling them can be taken
+    over by reclaim (e.g. after a restart binding the same member id). All members of a channel
+    have to agree on the mode. Streams mode is not supported by memory stores and AsyncChannel.
+
+    Streams
+        Key: same as the queue or inbox key
+        Value: redis stream of entries with field "m" holding a message envelope
+
+    Sharding:
+
+    Channels created with a list of shards (redis addresses or connections) spread the queues over
+    several redis instances. All incoming queues (or the inbox, or streams) of a receiver live on the
+    shard its id maps to on a consistent hash ring, so receive operations still block on a single
+    instance, while send operations push to the shards of all destinations (one pipeline per shard).
+    Member and subgroup sets, the queue registry and membership notifications stay on the meta shard
+    given by host_ip/port_no (or connection), which may also be one of the shards. All members of a
+    channel have to use the same list of shards in the same order. For local tests, start several
+    instances (e.g. redis-server --port 6380) and pass shards=[('localhost', 6380), ('localhost', 6381)].
+
+    Connections:
+
+    Redis clients of all channels of a process share one connection pool per redis server (see connect),
+    which may also be reached over a unix domain socket (unix_socket_path, or a path in the shards list).
+    A forked child process starts with fresh pools and re-subscribes to membership notifications on first use.
+    Channels can also be pickled, e.g. as argument of a spawned process: they reconnect to the pools
+    of the receiving process and start with empty membership views (bind the member id there again).
+
+    Bounded Queues:
+
+    Channels created with a max_queue_length check the length of the destination queues (or inboxes)
+    before pushing a message. The overflow policy decides what happens to a message for a full queue:
+    'block' waits until the receiver took messages off the queue, 'drop_oldest' trims the oldest messages,
+    'drop_newest' discards the new message (for the full queues only) and 'raise' raises QueueFullError
+    before the message is sent to any destination. Each full destination queue counts as an overflow
+    (counter 'overflows' in stats). As lengths are checked before pushing, concurrent senders to the same
+    inbox can exceed the bound slightly (sender-receiver queues have a single sender).
+    Streams keep delivered entries until they are trimmed, so streams mode only supports 'drop_oldest'
+    (trimming to exactly max_queue_length entries, overflows are not counted).
+
+    Priority Lanes:
+
+    Channels created with priorities=n > 1 split each queue (inbox, stream) into n lanes. Send operations
+    take a priority (0 = NORMAL_PRIORITY up to n - 1, e.g. HIGH_PRIORITY for control messages) and push
+    to the respective lane. Receive operations pass the lanes of higher priority first to BLPOP/LMPOP
+    (or XREADGROUP), so control messages overtake any backlog of normal messages. Messages keep their
+    order within a lane only. Messages already taken off redis into the local buffer (inbox and streams
+    mode) are served first regardless of their priority. All members of a channel have to use the same
+    number of lanes.
+
+    Lanes (priority p > 0)
+        Key: "['<member1>','<member2>',p]" or "inbox:<member>:p"
+        Value: same as the queue or inbox of normal priority
+
+    Shared Broadcasts:
+
+    Channels created with a broadcast_threshold store envelopes of at least that many bytes sent to several
+    receivers only once per shard, as a hash holding the envelope and the number of receivers, and push small
+    reference envelopes to the queues instead (all in the same pipeline). Receivers load the envelope and count
+    down in one round trip, the last one deletes it. References dropped by the drop_oldest policy or deleted
+    by the reaper are counted down as well, references trimmed off streams or expired only when the stored
+    envelope expires (channels with a ttl). AsyncChannel members can receive such messages, too.
+
+    Stored Envelopes
+        Key: "blob:<uuid>:<shard index>"
+        Value: redis hash with fields "e" (envelope) and "r" (number of unread references)
+
+    Shared Memory:
+
+    Channels created with a shared_memory_threshold copy envelopes of at least that many bytes into a new
+    shared memory segment (multiprocessing.shared_memory) and only push a small handle (segment name and size)
+    to the queues, so multi-megabyte messages do not travel through redis. Receivers decode the message straight
+    from the segment and count down its references, the last one unlinks the segment. This requires that all
+    members of the channel run on the same (POSIX) host. Handles dropped by the drop_oldest policy or deleted
+    by the reaper are counted down as well, but segments of handles trimmed off streams are not unlinked.
+    As expired handles could not be counted down, a shared_memory_threshold can not be combined with a ttl.
+    AsyncChannel members copy the envelope out of the segment instead of decoding it in place (no zero-copy).
+
+    Shared Memory References
+        Key: "shm:<segment name>"
+        Value: redis hash with field "r" (number of unread handles)
+
+    Expiry and Reaping:
+
+    Channels created with a ttl (in seconds) let unread messages expire. Each envelope carries the time it
+    expires at, and receivers drop expired messages when taking them off the queues (the clocks of all hosts
+    should be synchronized). Queues and inboxes expire as a whole ttl seconds after the last message was pushed,
+    i.e. once all of their messages expired, stored broadcast envelopes ttl seconds after they were stored.
+    Streams trim entries older than ttl whenever a new entry is appended. Either way, the queues of a receiver
+    that crashed are deleted once no new messages arrive for ttl seconds (bound them with max_queue_length
+    if senders keep sending). Expiry requires redis (not a MemoryStore).
+
+    reap() deletes all queues (inboxes, streams) whose receiver is no longer a member (e.g. left the channel
+    before reading all messages), counts down the stored envelopes and segments their messages refer to and
+    reports the
+    number of queues and bytes reclaimed. Channels created with a reap_interval call it periodically in a
+    background thread. A queue is only reaped if its receiver id is unknown, so a member reusing the id
+    of a departed member right when the reaper runs may lose messages.
+
+    Statistics:
+
+    Each channel counts calls, messages and envelope bytes and keeps a latency histogram for join, send and
+    receive operations (see lab_stats). stats() returns a snapshot of them together with the current depths
+    of the incoming queues of the member bound to the calling process (for streams: the entries not delivered
+    to the receiver yet). Channels created with a stats_file append such a snapshot as a line of JSON to the
+    file every stats_interval seconds.
     """
 
-    def __init__(self, n_bits: int = 5, host_ip: str = 'localhost', port_no: int = 6379):
-        # create redis client
-        self.channel = redis.StrictRedis(host=host_ip, port=port_no, db=0)
-        # create dict of local pid bindings
-        self.os_members = {}
-        # Number of bits for pid addresses
-        self.n_bits: int = n_bits
-        # Maximum corresponding pid
-        self.MAXPROC: int = pow(2, n_bits)
-        # create instance logger
-        self.logger = logging.getLogger('vs2lab.channel.Channel')
-        self.logger.debug('New Channel created.')
+    def __init__(self, n_bits: int = 5, host_ip: str = 'localhost', port_no: int = 6379, inbox: bool = False,
+                 codec: Codec | None = None, compression: str | None = None, compress_threshold: int = 16384,
+                 connection=None, streams: bool = False, max_stream_length: int | None = None,
+                 shards: list | None = None, unix_socket_path: str | None = None, stats_file: str | None = None,
+                 stats_interval: float = 10.0, max_queue_length: int | None = None, overflow: str = 'block',
+                 namespace: str = '', ttl: int | None = None, reap_interval: float | None = None,
+                 priorities: int = 1, broadcast_threshold: int | None = None,
+                 shared_memory_threshold: int | None = None):
+        super().__init__(n_bits, inbox, codec, compression, compress_threshold, namespace, priorities)
+        # create redis client on the shared pool (unless another connection like a MemoryStore is given)
+        self.channel = connection if connection is not None else connect(host_ip, port_no, unix_socket_path)
+        # create clients of the shards holding the queues (given as (host, port) tuples, socket paths or connections)
+        self.__shards: list = [self.channel] if not shards else [_connection(shard) for shard in shards]
+        # consistent hash ring of the shards: sorted points and the shard index of each point
+        ring: list = sorted((_ring_hash('{}#{}'.format(index, replica)), index)
+                            for index in range(len(self.__shards)) for replica in range(SHARD_REPLICAS))
+        self.__ring_points: list[int] = [point for point, _ in ring]
+        self.__ring_shards: list[int] = [index for _, index in ring]
+        # membership views are only cached if they can be invalidated by redis pub/sub
+        self.__cache_membership: bool = isinstance(self.channel, redis.Redis)
+        # store queues as redis streams read through consumer groups (trimmed to about max_stream_length)
+        assert not streams or all(isinstance(shard, redis.Redis) for shard in [self.channel] + self.__shards), \
+            'streams require redis'
+        self.streams: bool = streams
+        self.max_stream_length: int | None = max_stream_length
+        # bound of queue lengths (None for unbounded queues) and policy for messages to full queues
+        assert overflow in OVERFLOW_POLICIES, 'unknown overflow policy'
+        assert not streams or max_queue_length is None or overflow == 'drop_oldest', 'streams can only drop oldest'
+        self.max_queue_length: int | None = max_queue_length
+        self.overflow: str = overflow
+        # stream keys known to have a consumer group
+        self.__groups: set = set()
+        # background thread receiving membership notifications (started on first use of the cache)
+        # and the os pid of the process that started it (threads do not survive a fork)
+        self.__membership_thread = None
+        self.__membership_pid: int | None = None
+        self.__membership_lock = threading.Lock()
+        # operation statistics (periodically dumped to stats_file if given)
+        self.__stats: ChannelStats = ChannelStats()
+        self.stats_file: str | None = stats_file
+        self.stats_interval: float = stats_interval
+        if stats_file:
+            dump_periodically(stats_file, stats_interval, self.stats)
+        # expiry of unread messages in seconds and interval of the background reaper in seconds (None if unused)
+        assert ttl is None or isinstance(self.channel, redis.Redis), 'expiry requires redis'
+        self.ttl: int | None = ttl
+        self.reap_interval: float | None = reap_interval
+        if reap_interval:
+            self.__start_reaper()
+        # minimum envelope size of messages to several receivers that are stored once (None to always copy)
+        self.broadcast_threshold: int | None = broadcast_threshold
+        # minimum envelope size of messages handed over in shared memory segments (None to always use redis)
+        assert shared_memory_threshold is None or os.name == 'posix', 'shared memory hand-off requires POSIX'
+        assert shared_memory_threshold is None or ttl is None, 'shared memory hand-off does not support expiry'
+        self.shared_memory_threshold: int | None = shared_memory_threshold
+        _channels.add(self)
 
-    @staticmethod
-    def __decode_set(raw) -> set:
-        return {i.decode() for i in raw}
+    def __getstate__(self) -> dict:
+        """ Pickle clients as their addresses and drop process-local state (thread, membership views) """
+        state: dict = self.__dict__.copy()
+        state['channel'] = _spec(self.channel)
+        state['_Channel__shards'] = [_spec(shard) for shard in self.__shards]
+        state['_Channel__membership_thread'] = None
+        state['_Channel__membership_pid'] = None
+        state['_Channel__membership_lock'] = None
+        state['_members'] = None
+        state['_subgroups'] = {}
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        """ Reconnect to the shared pools of the unpickling process """
+        self.__dict__.update(state)
+        self.__membership_lock = threading.Lock()
+        self.channel = _connection(self.channel)
+        self.__shards = [_connection(shard) for shard in self.__shards]
+        if self.stats_file:
+            dump_periodically(self.stats_file, self.stats_interval, self.stats)
+        if self.reap_interval:
+            self.__start_reaper()
+        _channels.add(self)
+
+    def _after_fork(self) -> None:
+        """
+        Reset the state a forked child process inherits from its parent: the membership lock (it might have been
+        held by another thread of the parent at fork time), the notification thread (threads do not survive a fork)
+        and the views (they miss all changes since the fork). The child subscribes again on first use of the views.
+        :return: None
+        """
+        self.__membership_lock = threading.Lock()
+        self.__membership_thread = None
+        self.__membership_pid = None
+        self._invalidate_membership()
+
+    def __watch_membership(self) -> bool:
+        """
+        Subscribe to membership notifications (once per process) so local views get invalidated on changes.
+        Must be called before the views are filled, otherwise a concurrent change could be missed.
+        :return: boolean value, true if local views may be kept
+        """
+        if self.__cache_membership and self.__membership_pid != os.getpid():
+            with self.__membership_lock:
+                # another thread might have subscribed in the meantime
+                if self.__membership_pid != os.getpid():
+                    # views inherited from a parent process missed all changes since the fork
+                    self._invalidate_membership()
+                    pubsub = self.channel.pubsub(ignore_subscribe_messages=True)
+                    pubsub.subscribe(**{self._key(MEMBERSHIP_TOPIC): self._invalidate_membership})
+                    self.__membership_thread = pubsub.run_in_thread(sleep_time=1, daemon=True,
+                                                                    exception_handler=self.__membership_failed)
+                    self.__membership_pid = os.getpid()
+        return self.__cache_membership
+
+    def __membership_failed(self, error: BaseException, pubsub, thread) -> None:
+        """
+        Handle a failure of the notification thread (e.g. a dropped connection): notifications might have been
+        missed, so stop the thread, drop the local views and subscribe again on the next use of the views.
+        :param error: exception raised while receiving notifications
+        :param pubsub: pub/sub object of the thread (closed by the stopped thread)
+        :param thread: the notification thread
+        :return: None
+        """
+        self.logger.warning("Membership notifications failed: {}".format(error))
+        thread.stop()
+        with self.__membership_lock:
+            if self.__membership_thread is thread:
+                self.__membership_pid = None
+                self._invalidate_membership()
+
+    def __member_set(self, refresh: bool = False) -> set:
+        """
+        Retrieve the global member set from the local view, reading it from redis only if invalidated.
+        :param refresh: force a re-read of the member set
+        :return: set of member ids
+        """
+        cache: bool = self.__watch_membership()
+        members = self._members
+        if members is None or refresh:
+            generation: int = self._membership_generation
+            members = self._decode_set(self.channel.smembers(self._key('members')))
+            # a change notified while reading might not be contained in the result
+            if cache and generation == self._membership_generation:
+                self._members = members
+        return members
+
+    def __is_member(self, pid: str) -> bool:
+        """
+        Validate a member id against the local view (re-reading it once if the id is unknown).
+        :param pid: member id
+        :return: boolean value, true if pid is a member
+        """
+        return pid in self.__member_set() or pid in self.__member_set(refresh=True)
+
+    def __claim_id(self) -> str:
+        """
+        Atomically claim a new/unused random member id in the global member set.
+        Random probing takes O(1) round trips as long as the id space is not crowded.
+        Only after repeated collisions, the unused ids are computed from the member set.
+        :return: claimed member id
+        """
+        for _ in range(CLAIM_PROBES):
+            pid: str = str(random.randrange(self.MAXPROC))
+            if self.channel.sadd(self._key('members'), pid):
+                return pid
+        while True:
+            members: set = self._decode_set(self.channel.smembers(self._key('members')))
+            assert len(members) < self.MAXPROC, 'no member id left'
+            pid = random.choice([str(i) for i in range(self.MAXPROC) if str(i) not in members])
+            if self.channel.sadd(self._key('members'), pid):
+                return pid
 
     def join(self, subgroup: str) -> str:
         """
-        Join a process as a member to the global channel and associate it with a (sub)group. 
-        Only members can communicate over the channel. 
+        Join a process as a member to the global channel and associate it with a (sub)group.
+        Only members can communicate over the channel.
         Subgroups can be used to retrieve a specific set of processes later (e.g. all servers).
         :param subgroup: an identifier for the grouping
         :return: global member id of the process.
         """
-        # For concurrently assigning unique member ids, we need to use a transaction
-        # atomically reading and writing the member set. This can be implemented by
-        # means of the pipeline construct.
-        with self.channel.pipeline() as pipe:
-            while 1:
-                try:
-                    # Put a WATCH on the key that holds the member set
-                    pipe.watch('members')
-                    # After WATCHing, the pipeline is put into immediate execution
-                    # mode until we tell it to start buffering commands again.
-                    # This allows us to get the current value of the global member set
-                    raw_members = pipe.smembers('members')
-                    members = self.__decode_set(raw_members)
-                    # Now construct new/unused random member id
-                    remaining_ids = list(set([str(i) for i in range(self.MAXPROC)]) - members)
-                    new_pid = random.choice(remaining_ids)
-                    # Then we can put the pipeline back into buffered mode with MULTI
-                    pipe.multi()
-                    # Add new member id to global member set and subgroup
-                    pipe.sadd('members', new_pid)
-                    pipe.sadd(subgroup, new_pid)
-                    # and finally, execute the pipeline (the set command)
-                    pipe.execute()
-                    # if a WatchError wasn't raised during execution,
-                    # everything we just did happened atomically.
-                    break
-                except redis.WatchError:
-                    # another client must have changed 'members' between
-                    # the time we started WATCHing it and the pipeline's execution.
-                    # our best bet is to just retry.
-                    continue
+        # For concurrently assigning unique member ids, each attempt atomically claims a
+        # random id by adding it to the member set. SADD reports whether the id was new,
+        # so no transaction (and no retry on concurrent changes of the set) is needed.
+        started: float = time.perf_counter()
+        new_pid: str = self.__claim_id()
         self.logger.info("Member {} joining {}.".format(new_pid, subgroup))
 
-        # construct bidirectional queue names for new member and all existing members (if any)
-        if len(members) > 0:
-            xchan: list = [[new_pid, other] for other in members] + [[other, new_pid] for other in members]
-            # push queue names to global list of all possible transfer queues
-            for xc in xchan:
-                self.channel.rpush('xchan', pickle.dumps(xc))
+        # Retrieve all other members. Concurrent joins read the member set after claiming their
+        # own id, so at least one of two joining members sees the other one.
+        members: set = self._decode_set(self.channel.smembers(self._key('members'))) - {new_pid}
+
+        with self.channel.pipeline() as pipe:
+            # Add new member id to subgroup set
+            pipe.sadd(self._key(subgroup), new_pid)
+            # add bidirectional queue names for new member and all existing members (if any)
+            # to global set of all possible transfer queues in bulk
+            if len(members) > 0:
+                pipe.sadd(self._key('xchan'), *self._queue_keys(new_pid, members))
+            # announce the membership change to all channels
+            pipe.publish(self._key(MEMBERSHIP_TOPIC), subgroup)
+            pipe.execute()
+        self.__stats.record('join', started, 0)
         return new_pid
 
     def leave(self, subgroup: str):
         """
-        Unregister a process from the global channel (and subgroup).
+        Unregister the calling member from the global channel (and subgroup).
         :param subgroup: subgroup identifier
         :return: None
         """
-        # retrieve member id via os pid and validate it
-        os_pid: int = os.getpid()
-        pid: str = self.os_members[os_pid]
-        assert self.channel.sismember('members', pid), 'member unknown'
+        # retrieve member id via handle or os pid and validate it
+        pid: str = self._caller()
+        assert self.channel.sismember(self._key('members'), pid), 'member unknown'
         self.logger.info("Member {} leaving {}".format(pid, subgroup))
 
-        # remove binding and global member element
-        del self.os_members[os_pid]
-        self.channel.srem('members', pid)
-
-        # decode member set binary elements to string list
-        raw_members: set = self.channel.smembers('members')
-        members: set = self.__decode_set(raw_members)
+        # remove binding, local state and global member element and retrieve remaining members
+        self._forget(pid)
+        with self.channel.pipeline() as pipe:
+            pipe.srem(self._key('members'), pid)
+            pipe.smembers(self._key('members'))
+            members: set = self._decode_set(pipe.execute()[-1])
 
-        # construct bidirectional queue names for new member and all existing members (if any)
-        if len(members) > 0:
-            xchan: list = [[pid, other] for other in members] + [[other, pid] for other in members]
-            # pop queue names from global list of all possible transfer queues
-            for xc in xchan:
-                self.channel.lrem('xchan', 0, pickle.dumps(xc))
+        with self.channel.pipeline() as pipe:
+            # remove bidirectional queue names for leaving member and all remaining members (if any)
+            # from global set of all possible transfer queues in bulk
+            if len(members) > 0:
+                pipe.srem(self._key('xchan'), *self._queue_keys(pid, members))
+            # remove member id from subgroup set and announce the membership change to all channels
+            pipe.srem(self._key(subgroup), pid)
+            pipe.publish(self._key(MEMBERSHIP_TOPIC), subgroup)
+            pipe.execute()
 
-        # remove member id from subgroup set
-        self.channel.srem(subgroup, pid)
+    def member(self, pid: str) -> 'Member':
+        """
+        Create a handle acting on behalf of a member (instead of the member bound to the os pid).
+        :param pid: member id (e.g. as returned by join)
+        :return: member handle
+        """
+        return Member(self, pid)
 
     def exists(self, pid: str) -> bool:
         """
@@ -144,20 +1005,15 @@ class Channel:
         :param pid: process identifier
         :return: boolean value, true if pid is a member
         """
-        return self.channel.sismember('members', pid)
+        # ids are compared as strings (like redis does)
+        return self.__is_member(str(pid))
 
-    def bind(self, pid: str) -> int:
+    def members(self) -> set:
         """
-        Associate os pid with channel member id.
-        Thus a caller does not need to provide its id for every subsequent call.
-        :param pid: identifier of process member
-        :return: os pid value
+        Retrieve all members (from the local view of the member set).
+        :return: set of member process identifiers
         """
-        # retrieve os pid and map to given member id
-        os_pid: int = os.getpid()
-        self.os_members[os_pid] = pid
-        self.logger.debug("Member {} bound {}".format(pid, os_pid))
-        return os_pid
+        return set(self.__member_set())
 
     def subgroup(self, subgroup: str) -> set:
         """
@@ -165,82 +1021,599 @@ class Channel:
         :param subgroup: subgroup string identifier
         :return: set of member process identifiers
         """
-        return self.__decode_set(self.channel.smembers(subgroup))
+        cache: bool = self.__watch_membership()
+        members = self._subgroups.get(subgroup)
+        if members is None:
+            generation: int = self._membership_generation
+            members = self._decode_set(self.channel.smembers(self._key(subgroup)))
+            if cache and generation == self._membership_generation:
+                self._subgroups[subgroup] = members
+        return set(members)
 
-    @staticmethod
-    def __queue_key(sender: str, receiver: str) -> str:
+    def __shard(self, receiver: str):
         """
-        Construct queue name from sender and receiver ids.
-        :param sender: member identifier
-        :param receiver: member identifier
-        :return: redis key
+        Select the shard holding the incoming queues of a receiver (first ring point at or after its hash).
+        :param receiver: receiver id
+        :return: redis client (or other connection) of the shard
         """
-        return str([sender, receiver])
+        if len(self.__shards) == 1:
+            return self.__shards[0]
+        point: int = bisect.bisect_left(self.__ring_points, _ring_hash(receiver)) % len(self.__ring_points)
+        return self.__shards[self.__ring_shards[point]]
 
-    def send_to(self, destination_set: set, message: object) -> None:
+    def __push(self, caller: str, destinations, message: object, priority: int) -> int:
         """
-        Sends an asynchronous, persistent multicast message.
-        :param destination_set: a set of member identifiers
-        :param message: the message object to be send (see 'message format' in class doc)
-        :return: None
+        Push a message to the incoming queues of all destinations in one round trip per shard.
+        :param caller: sender id
+        :param destinations: iterable of receiver ids
+        :param message: the message object to be send
+        :param priority: priority lane
+        :return: number of envelope bytes pushed
         """
-        # destination_set needs to contain string identifiers
-        assert all(type(k) is str for k in destination_set), 'type error'
+        assert 0 <= priority < self.priorities, 'unknown priority'
+        expires: int | None = None if self.ttl is None else int((time.time() + self.ttl) * 1000)
+        envelope: bytes = self._encode(caller, message, expires)
+        # group destination queues by shard
+        shard_keys: dict = {}
+        for destination in destinations:
+            shard = self.__shard(destination)
+            shard_keys.setdefault(id(shard), (shard, []))[1].append(self._out_key(caller, destination, priority))
 
-        # lookup member id by pid and validate it
-        caller: str = self.os_members[os.getpid()]
-        assert self.channel.sismember('members', caller), 'unknown sender'
-        self.logger.debug("{} sends {} to {}".format(caller, message, destination_set))
+        # apply the overflow policy to all shards before anything is sent
+        if self.max_queue_length is not None and not self.streams:
+            shard_keys = {index: (shard, self.__admit(shard, keys)) for index, (shard, keys) in shard_keys.items()}
 
-        # push message to incoming queues of all destinations
-        for destination in destination_set:
-            assert self.channel.sismember('members', destination), 'unknown receiver'
-            self.channel.rpush(self.__queue_key(caller, destination), pickle.dumps(message))
+        # trim streams to the bound of the queue length or (approximately) to the maximum stream length
+        if self.max_queue_length is not None and self.overflow == 'drop_oldest':
+            max_length, approximate = self.max_queue_length, False
+        else:
+            max_length, approximate = self.max_stream_length, True
+
+        # hand large envelopes over in shared memory (one segment for all receivers)
+        receivers: int = sum(len(keys) for _, keys in shard_keys.values())
+        if self.shared_memory_threshold is not None and receivers and len(envelope) >= self.shared_memory_threshold:
+            envelope = self.__share(caller, envelope, receivers)
+
+        # lists trimmed to the bound of the queue length (atomically with reading the trimmed messages)
+        trim: bool = self.max_queue_length is not None and self.overflow == 'drop_oldest' and not self.streams
 
-    def send_to_all(self, message: object) -> None:
+        blob_id: str = uuid.uuid4().hex
+        nbytes: int = 0
+        for index, (shard, keys) in enumerate(shard_keys.values()):
+            queued: bytes = envelope
+            with shard.pipeline(transaction=trim) as pipe:
+                if self.broadcast_threshold is not None and len(keys) > 1 and len(envelope) >= self.broadcast_threshold:
+                    # store the envelope once per shard and queue references to it
+                    blob_key: str = self._key('blob:{}:{}'.format(blob_id, index))
+                    pipe.hset(blob_key, mapping={'e': envelope, 'r': len(keys)})
+                    if self.ttl is not None:
+                        pipe.expire(blob_key, self.ttl)
+                    queued = self._encode_reference(caller, blob_key)
+                    nbytes += len(envelope)
+                for key in keys:
+                    if self.streams:
+                        pipe.xadd(key, {'m': queued}, maxlen=max_length, approximate=approximate)
+                        if self.ttl is not None:
+                            # stream entry ids start with the time of their creation in milliseconds
+                            pipe.xtrim(key, minid=int((time.time() - self.ttl) * 1000), approximate=False)
+                    else:
+                        pipe.rpush(key, queued)
+                        if self.ttl is not None:
+                            # the queue expires when all of its messages expired (messages expire one by one)
+                            pipe.expire(key, self.ttl)
+                if trim:
+                    # drop the oldest messages beyond the bound (the trims are the last commands of the pipeline)
+                    for key in keys:
+                        pipe.lrange(key, 0, -self.max_queue_length - 1)
+                        pipe.ltrim(key, -self.max_queue_length, -1)
+                results: list = pipe.execute()
+            if trim:
+                self.__release(shard, [envelope for dropped in results[-2 * len(keys)::2] for envelope in dropped])
+            nbytes += len(queued) * len(keys)
+        return nbytes
+
+    def __share(self, caller: str, envelope: bytes, receivers: int) -> bytes:
         """
-        Sends an asynchronous, persistent broadcast message.
-        The message is delivered to all queues of currently registered members.
-        :param message: the message object to be send
+        Copy an envelope into a new shared memory segment and register the number of its receivers.
+        :param caller: sender id
+        :param envelope: envelope bytes
+        :param receivers: number of queues the handle is pushed to
+        :return: envelope bytes of the handle
+        """
+        # segments are not tracked, as they outlive the sender (the last receiver unlinks them)
+        segment = shared_memory.SharedMemory(create=True, size=len(envelope), track=False)
+        segment.buf[:len(envelope)] = envelope
+        segment.close()
+        self.channel.hset(self._key('shm:' + segment.name), 'r', receivers)
+        return self._encode_shared(caller, segment.name, len(envelope))
+
+    def _decode(self, caller: str, envelope: bytes) -> tuple[str, Any] | None:
+        """
+        Unwrap an envelope (loading stored envelopes and attaching shared memory segments) and deserialize
+        the message it contains.
+        :param caller: receiver id
+        :param envelope: envelope bytes
+        :return: tuple of sender id and message object or None if the message expired
+        """
+        flags, _, offset = self._header(envelope)
+        if flags & REFERENCE_FLAG:
+            stored: bytes | None = self._dereference(caller, bytes(envelope[offset:]))
+            return None if stored is None else super()._decode(caller, stored)
+        if flags & SHARED_FLAG:
+            return self._attach(caller, bytes(envelope[offset:]))
+        return super()._decode(caller, envelope)
+
+    def _attach(self, caller: str, handle: bytes) -> tuple[str, Any] | None:
+        """
+        Decode an envelope straight from a shared memory segment and count down its references
+        (unlinking the segment after the last one).
+        :param caller: receiver id
+        :param handle: size and name of the segment
+        :return: tuple of sender id and message object or None if the message expired
+        """
+        (size,) = _SHARED_HANDLE.unpack_from(handle)
+        name: str = handle[_SHARED_HANDLE.size:].decode()
+        try:
+            segment = shared_memory.SharedMemory(name=name, track=False)
+        except FileNotFoundError:
+            # unlinked in the meantime (e.g. by the reaper of another member)
+            return None
+        view = segment.buf[:size]
+        decoded = self._decode(caller, view)
+        if decoded is not None and isinstance(decoded[1], Routed) and decoded[1]._raw is not None:
+            # the body of a routed message is decoded later, so it needs a copy
+            decoded[1]._raw = bytes(decoded[1]._raw)
+        try:
+            view.release()
+            segment.close()
+        except BufferError:
+            # the message refers to the segment (e.g. out-of-band pickle buffers), it stays mapped until released
+            pass
+        if self.channel.hincrby(self._key('shm:' + name), 'r', -1) <= 0:
+            self.channel.unlink(self._key('shm:' + name))
+            segment.unlink()
+        return decoded
+
+    def _dereference(self, caller: str, key: bytes) -> bytes | None:
+        """
+        Load an envelope stored once for all receivers and count down its references (deleting it after the last one).
+        :param caller: receiver id
+        :param key: redis key of the stored envelope
+        :return: envelope bytes or None if the envelope expired
+        """
+        shard = self.__shard(caller)
+        with shard.pipeline(transaction=False) as pipe:
+            pipe.hget(key, 'e')
+            pipe.hincrby(key, 'r', -1)
+            envelope, references = pipe.execute()
+        if references <= 0:
+            shard.unlink(key)
+        return envelope
+
+    def __release(self, shard, envelopes: list) -> None:
+        """
+        Count down the stored envelopes and shared memory segments referenced by envelopes that are dropped
+        unread (deleting them after the last reference).
+        :param shard: redis client (or other connection) of the shard holding the dropped envelopes
+        :param envelopes: list of envelope bytes
         :return: None
         """
-        # lookup member id by pid and validate it
-        caller: str = self.os_members[os.getpid()]
-        assert self.channel.sismember('members', caller), 'unknown sender'
-        self.logger.debug("{} sends {} to all members".format(caller, message))
+        keys: list = []
+        names: list = []
+        for envelope in envelopes:
+            flags, _, offset = self._header(envelope)
+            if flags & REFERENCE_FLAG:
+                keys.append(envelope[offset:])
+            elif flags & SHARED_FLAG:
+                names.append(envelope[offset + _SHARED_HANDLE.size:].decode())
+        if keys:
+            with shard.pipeline(transaction=False) as pipe:
+                for key in keys:
+                    pipe.hincrby(key, 'r', -1)
+                references: list = pipe.execute()
+            released: list = [key for key, count in zip(keys, references) if count <= 0]
+            if released:
+                shard.unlink(*released)
+        if names:
+            with self.channel.pipeline(transaction=False) as pipe:
+                for name in names:
+                    pipe.hincrby(self._key('shm:' + name), 'r', -1)
+                references = pipe.execute()
+            for name, count in zip(names, references):
+                if count <= 0:
+                    self.channel.unlink(self._key('shm:' + name))
+                    _unlink_segment(name)
 
-        members = self.__decode_set(self.channel.smembers('members'))
-        # push message to incoming queues of all members
-        for destination in members:
-            self.channel.rpush([self.__queue_key(caller, destination)], pickle.dumps(message))
+    def __admit(self, shard, keys: list) -> list:
+        """
+        Check the lengths of destination queues on a shard and apply the overflow policy to the full ones.
+        :param shard: redis client (or other connection) of the shard
+        :param keys: destination queue keys
+        :return: keys of the queues to push the message to
+        """
+        delay: float = 0.001
+        overflowed: bool = False
+        while True:
+            with shard.pipeline(transaction=False) as pipe:
+                for key in keys:
+                    pipe.llen(key)
+                lengths: list = pipe.execute()
+            full: list = [key for key, length in zip(keys, lengths) if length >= self.max_queue_length]
+            if not full:
+                return keys
+            if not overflowed:
+                self.__stats.increment('overflows', len(full))
+                overflowed = True
 
-    def receive_from_any(self, timeout: int = 0) -> tuple[str, Any] | None:
+            match self.overflow:
+                case 'drop_oldest':
+                    # the push trims the oldest messages (and releases what they reference)
+                    return keys
+                case 'drop_newest':
+                    self.logger.debug("Dropping message to full queues {}".format(full))
+                    return [key for key in keys if key not in full]
+                case 'raise':
+                    raise QueueFullError('Queues full: {}'.format(full))
+                case _:
+                    # block until the receivers took messages off the full queues (polling with backoff)
+                    time.sleep(delay)
+                    delay = min(2 * delay, BLOCK_POLL_MAX)
+
+    def __stream_keys(self, caller: str, sender_set: set | None) -> list[str]:
         """
-        Make a blocking request to take the next message off any of the callers' incoming queues.
-        :param timeout: optional timeout for blocking read.
-        :return: list containing the queue name and message
+        Construct the names of the incoming streams of the caller for a set of senders (streams mode).
+        Also makes sure a consumer group exists for each of the streams.
+        :param caller: receiver id
+        :param sender_set: set of sender ids or None for all members
+        :return: list of redis keys
+        """
+        keys: list = self._in_keys(caller, self.__member_set() if sender_set is None else sender_set)
+
+        # create consumer groups (reading from the start of the stream) for streams not seen before
+        missing: list = [key for key in keys if key not in self.__groups]
+        if missing:
+            with self.__shard(caller).pipeline(transaction=False) as pipe:
+                for key in missing:
+                    pipe.xgroup_create(key, STREAM_GROUP, id='0', mkstream=True)
+                results = pipe.execute(raise_on_error=False)
+            for key, result in zip(missing, results):
+                # a BUSYGROUP error just means that the group was created before
+                if isinstance(result, redis.ResponseError) and 'BUSYGROUP' not in str(result):
+                    raise result
+                self.__groups.add(key)
+        return keys
+
+    def __ack(self, pipe, caller: str) -> None:
+        """
+        Queue acknowledgements for all messages handed out to the caller so far on a pipeline (streams mode).
+        :param pipe: redis pipeline
+        :param caller: receiver id
+        :return: None
+        """
+        entry_ids: dict = {}
+        for key, entry_id in self._unacked.pop(caller, []):
+            entry_ids.setdefault(key, []).append(entry_id)
+        for key, ids in entry_ids.items():
+            pipe.xack(key, STREAM_GROUP, *ids)
+
+    def __read_streams(self, caller: str, sender_set: set | None, max_messages: int,
+                       timeout: int) -> list[tuple[str, Any]]:
+        """
+        Take up to max_messages messages from the senders off the local buffer or the callers' incoming streams,
+        blocking only if there is no message at all (streams mode). Messages handed out before are acknowledged.
+        :param caller: receiver id
+        :param sender_set: set of sender ids or None for any sender
+        :param max_messages: maximum number of messages to return
+        :param timeout: optional timeout for blocking read (0 blocks forever)
+        :return: list of tuples of sender id and message
+        """
+        # serve buffered messages first (in order of arrival)
+        messages: list = self._take_pending(caller, sender_set, max_messages)
+        if messages:
+            return messages
+
+        keys: list = self.__stream_keys(caller, sender_set)
+        deadline: float = time.monotonic() + timeout
+        while True:
+            remaining: float = 0 if timeout == 0 else deadline - time.monotonic()
+            if timeout != 0 and remaining <= 0:
+                return []
+            # acknowledge previous messages and read a batch of new ones in one round trip
+            with self.__shard(caller).pipeline(transaction=False) as pipe:
+                self.__ack(pipe, caller)
+                pipe.xreadgroup(STREAM_GROUP, caller, {key: '>' for key in keys},
+                                count=max_messages, block=max(1, int(remaining * 1000)) if timeout else 0)
+                result = pipe.execute()[-1]
+            if not result:
+                return []
+            envelopes: list = []
+            tokens: list = []
+            for key, entries in result:
+                for entry_id, fields in entries:
+                    envelopes.append(fields[b'm'])
+                    tokens.append((key, entry_id))
+            # each stream returns up to max_messages entries, keep the surplus in the local buffer
+            messages = self._filter(caller, sender_set, envelopes, tokens, max_messages)
+            if messages:
+                return messages
+
+    def ack(self) -> None:
+        """
+        Acknowledge all messages received so far (streams mode).
+        Otherwise, messages are acknowledged when the next receive call is issued.
+        :return: None
+        """
+        caller: str = self._caller()
+        if self._unacked.get(caller):
+            with self.__shard(caller).pipeline(transaction=False) as pipe:
+                self.__ack(pipe, caller)
+                pipe.execute()
+
+    def reclaim(self, min_idle_time: int = 60000, max_messages: int = 100) -> list[tuple[str, Any]]:
+        """
+        Take over messages of the callers' incoming streams that were delivered but never acknowledged
+        for at least min_idle_time milliseconds, e.g. because the receiver crashed while handling them (streams mode).
+        :param min_idle_time: minimum time in milliseconds since the last delivery of a message
+        :param max_messages: maximum number of messages to take over per stream
+        :return: list of tuples of sender id and message
+        """
+        assert self.streams, 'reclaim requires streams mode'
+        caller: str = self._caller()
+        keys: list = self.__stream_keys(caller, None)
+        with self.__shard(caller).pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.xautoclaim(key, STREAM_GROUP, caller, min_idle_time, start_id='0-0', count=max_messages)
+            results = pipe.execute()
+
+        envelopes: list = []
+        tokens: list = []
+        for key, result in zip(keys, results):
+            for entry_id, fields in result[1]:
+                if fields:  # entries trimmed in the meantime have no fields
+                    envelopes.append(fields[b'm'])
+                    tokens.append((key, entry_id))
+        messages: list = self._filter(caller, None, envelopes, tokens)
+        self.logger.info("{} reclaimed {} messages".format(caller, len(messages)))
+        return messages
+
+    def __pop(self, caller: str, keys: list, timeout: int) -> tuple[str, Any] | None:
+        """
+        Take the next message off the first non-empty one of the callers' queues, dropping expired messages.
+        :param caller: receiver id
+        :param keys: queue keys
+        :param timeout: optional timeout for blocking read (0 blocks forever)
+        :return: tuple of sender id and message or None on timeout
+        """
+        deadline: float = time.monotonic() + timeout
+        while True:
+            remaining: float = 0 if timeout == 0 else deadline - time.monotonic()
+            if timeout != 0 and remaining <= 0:
+                return None
+            result = self.__shard(caller).blpop(keys, remaining)
+            if result is None:
+                return None
+            decoded = self._decode(caller, result[1])
+            if decoded is not None:
+                return decoded
+
+    def __pop_inbox(self, caller: str, sender_set: set | None, timeout: int) -> tuple[str, Any] | None:
+        """
+        Take the next message from one of the senders off the local buffer or the callers' inbox (inbox mode).
+        Messages from other senders are moved to the local buffer until they are asked for.
+        :param caller: receiver id
+        :param sender_set: set of sender ids or None for any sender
+        :param timeout: optional timeout for blocking read (0 blocks forever)
+        :return: tuple of sender id and message or None on timeout
+        """
+        # serve buffered messages first (in order of arrival)
+        buffered: list = self._take_pending(caller, sender_set, 1)
+        if buffered:
+            return buffered[0]
+
+        deadline: float = time.monotonic() + timeout
+        while True:
+            remaining: float = 0 if timeout == 0 else deadline - time.monotonic()
+            if timeout != 0 and remaining <= 0:
+                return None
+            # block until new msg appears in the inbox
+            result = self.__shard(caller).blpop(self._in_keys(caller, None), remaining)
+            if result is None:
+                return None
+            messages: list = self._filter(caller, sender_set, [result[1]])
+            if messages:
+                return messages[0]
+
+    def __drain_inbox(self, caller: str, sender_set: set | None, max_messages: int,
+                      timeout: int) -> list[tuple[str, Any]]:
+        """
+        Take up to max_messages messages from the senders off the local buffer or the callers' inbox,
+        blocking only if there is no message at all (inbox mode).
+        :param caller: receiver id
+        :param sender_set: set of sender ids or None for any sender
+        :param max_messages: maximum number of messages to return
+        :param timeout: optional timeout for blocking read (0 blocks forever)
+        :return: list of tuples of sender id and message
+        """
+        # serve buffered messages first (in order of arrival)
+        messages: list = self._take_pending(caller, sender_set, max_messages)
+
+        if len(messages) == 0:
+            result = self.__pop_inbox(caller, sender_set, timeout)
+            if result is None:
+                return []
+            messages.append(result)
+
+        # drain waiting messages off the inbox lane by lane (one round trip if a lane holds enough of them)
+        in_keys: list = self._in_keys(caller, None)
+        while len(messages) < max_messages:
+            result = self.__shard(caller).lmpop(len(in_keys), *in_keys, direction='LEFT',
+                                                count=max_messages - len(messages))
+            if result is None:
+                break
+            messages += self._filter(caller, sender_set, result[1])
+        return messages
+
+    def send_to(self, destination_set: set, message: object, priority: int = NORMAL_PRIORITY) -> None:
+        """
+        Sends an asynchronous, persistent multicast message.
+        :param destination_set: a set of member identifiers
+        :param message: the message object to be send (see 'message format' in class doc)
+        :param priority: priority lane (channels with several priorities only)
+        :return: None
+        """
+        # destination_set needs to contain string identifiers
+        assert all(type(k) is str for k in destination_set), 'type error'
+        started: float = time.perf_counter()
+
+        # lookup member id by handle or pid and validate it
+        caller: str = self._caller()
+        assert self.__is_member(caller), 'unknown sender'
+        self.logger.debug("{} sends {} to {}".format(caller, message, destination_set))
+
+        # validate all destinations before anything is sent
+        for destination in destination_set:
+            assert self.__is_member(destination), 'unknown receiver'
+
+        # push message to incoming queues of all destinations
+        nbytes: int = self.__push(caller, destination_set, message, priority)
+        self.__stats.record('send_to', started, len(destination_set), nbytes)
+
+    def send_to_all(self, message: object, priority: int = NORMAL_PRIORITY) -> None:
+        """
+        Sends an asynchronous, persistent broadcast message.
+        The message is delivered to all queues of currently registered members.
+        :param message: the message object to be send
+        :param priority: priority lane (channels with several priorities only)
+        :return: None
         """
-        # lookup member id by pid and validate it
-        caller = self.os_members[os.getpid()]
-        assert self.channel.sismember('members', str(caller)), 'unknown receiver'
+        started: float = time.perf_counter()
+        # lookup member id by handle or pid and validate it
+        caller: str = self._caller()
+        assert self.__is_member(caller), 'unknown sender'
+        self.logger.debug("{} sends {} to all members".format(caller, message))
+
+        # push message to incoming queues of all members
+        members: set = self.__member_set()
+        nbytes: int = self.__push(caller, members, message, priority)
+        self.__stats.record('send_to_all', started, len(members), nbytes)
+
+    def __receive_from_any(self, timeout: int) -> tuple[str, Any] | None:
+        """ Take the next message off any of the callers' incoming queues (see receive_from_any) """
+        # lookup member id by handle or pid and validate it
+        caller: str = self._caller()
+        assert self.__is_member(caller), 'unknown receiver'
 
-        # decode member set binary elements
-        members: set = self.__decode_set(self.channel.smembers('members'))
+        if self.streams:
+            messages: list = self.__read_streams(caller, None, 1, timeout)
+            return messages[0] if messages else None
+
+        if self.inbox:
+            # a single blocking read on the callers' inbox
+            self.logger.debug("{} receives from any".format(caller))
+            result = self.__pop_inbox(caller, None, timeout)
+            if result is not None:
+                self.logger.debug("{} received {} from {}".format(caller, result[1], result[0]))
+            return result
+
+        # take member set from local view
+        members: set = self.__member_set()
         # construct incoming message queues for all members
-        in_queues: set = {self.__queue_key(member, caller) for member in members}
+        in_queues: list = self._in_keys(caller, members)
         self.logger.debug("{} receives from {}".format(caller, in_queues))
 
         # block until new msg appears on one of the incoming queues
-        result = self.channel.blpop(in_queues, timeout)
+        result = self.__pop(caller, in_queues, timeout)
+        if result is not None:
+            # log and return results
+            self.logger.debug("{} received {} from {}".format(caller, result[1], result[0]))
+        return result
+
+    def __receive_from(self, sender_set: set, timeout: int) -> tuple[str, Any] | None:
+        """ Take the next message off the callers' incoming queues from the senders (see receive_from) """
+        assert (type(k) is str for k in sender_set), 'Address type mismatch.'
+
+        # lookup member id by handle or pid and validate it
+        caller: str = self._caller()
+        assert self.__is_member(caller), 'unknown receiver'
+        self.logger.debug("{} receives from {}".format(caller, sender_set))
+
+        # validate all senders and construct incoming queues for them
+        for sender in sender_set:
+            assert self.__is_member(sender), 'unknown sender'
+        in_queues: list = self._in_keys(caller, set(sender_set))
+
+        if self.streams:
+            messages: list = self.__read_streams(caller, set(sender_set), 1, timeout)
+            return messages[0] if messages else None
+
+        if self.inbox:
+            # filter the callers' inbox for messages of the senders
+            result = self.__pop_inbox(caller, set(sender_set), timeout)
+            if result is not None:
+                self.logger.debug("{} received {} from {}".format(caller, result[1], result[0]))
+            return result
+
+        # block until new msg appears on one of the queues
+        result = self.__pop(caller, in_queues, timeout)
         if result is not None:
-            # extract sender id from key part
-            key: str = result[0].decode()
-            sender: str = key.split("'")[1]
-            # deserialize msg content
-            message = pickle.loads(result[1])
             # log and return results
-            self.logger.debug("{} received {} from {}".format(caller, message, sender))
-            return sender, message
+            self.logger.debug("{} received {} from {}".format(caller, result[1], result[0]))
+        return result
+
+    def __receive_many(self, sender_set: set | None, max_messages: int, timeout: int) -> list[tuple[str, Any]]:
+        """ Take up to max_messages messages off the callers' incoming queues (see receive_many) """
+        assert max_messages > 0, 'max_messages must be positive'
+
+        # lookup member id by handle or pid and validate it
+        caller: str = self._caller()
+        assert self.__is_member(caller), 'unknown receiver'
+        self.logger.debug("{} receives up to {} messages from {}".format(
+            caller, max_messages, 'any' if sender_set is None else sender_set))
+
+        if sender_set is not None:
+            for sender in sender_set:
+                assert self.__is_member(sender), 'unknown sender'
+            sender_set = set(sender_set)
+
+        if self.streams:
+            messages: list = self.__read_streams(caller, sender_set, max_messages, timeout)
+        elif self.inbox:
+            messages = self.__drain_inbox(caller, sender_set, max_messages, timeout)
+        else:
+            # construct incoming message queues for all senders
+            senders = self.__member_set() if sender_set is None else sender_set
+            in_queues: list = self._in_keys(caller, senders)
+
+            # block until new msg appears on one of the queues
+            result = self.__pop(caller, in_queues, timeout)
+            if result is None:
+                return []
+            messages = [result]
+
+            # drain remaining messages queue by queue (LMPOP takes from the first non-empty queue)
+            while len(messages) < max_messages:
+                result = self.__shard(caller).lmpop(len(in_queues), *in_queues,
+                                                    direction='LEFT', count=max_messages - len(messages))
+                if result is None:
+                    break
+                messages += self._decode_all(caller, result[1])
+
+        self.logger.debug("{} received {} messages".format(caller, len(messages)))
+        return messages
+
+    def receive_from_any(self, timeout: int = 0) -> tuple[str, Any] | None:
+        """
+        Make a blocking request to take the next message off any of the callers' incoming queues.
+        :param timeout: optional timeout for blocking read.
+        :return: list containing the queue name and message
+        """
+        started: float = time.perf_counter()
+        caller: str = self._caller()
+        received: int = self._received_bytes.get(caller, 0)
+        result = self.__receive_from_any(timeout)
+        self.__stats.record('receive_from_any', started, int(result is not None),
+                            self._received_bytes.get(caller, 0) - received)
+        return result
 
     def receive_from(self, sender_set: set, timeout: int = 0) -> tuple:
         """
@@ -250,27 +1623,682 @@ class Channel:
         :param timeout: optional timeout for blocking call
         :return:
         """
-        assert (type(k) is str for k in sender_set), 'Address type mismatch.'
+        started: float = time.perf_counter()
+        caller: str = self._caller()
+        received: int = self._received_bytes.get(caller, 0)
+        result = self.__receive_from(sender_set, timeout)
+        self.__stats.record('receive_from', started, int(result is not None),
+                            self._received_bytes.get(caller, 0) - received)
+        return result
 
-        # lookup member id by pid and validate it
-        caller: str = self.os_members[os.getpid()]
-        assert self.channel.sismember('members', caller), 'unknown receiver'
-        self.logger.debug("{} receives from {}".format(caller, sender_set))
+    def receive_many(self, sender_set: set | None = None, max_messages: int = 100,
+                     timeout: int = 0) -> list[tuple[str, Any]]:
+        """
+        Make a blocking call for the next message off the callers' queues (like receive_from or receive_from_any)
+        and then take up to max_messages - 1 further messages that are already waiting without blocking.
+        Draining a backlog this way takes a few round trips for a whole batch instead of one per message.
+        :param sender_set: set of ids to watch respective incoming queues for or None for all members
+        :param max_messages: maximum number of messages to return
+        :param timeout: optional timeout for blocking on the first message
+        :return: list of tuples of sender id and message (in order of arrival per sender), empty on timeout
+        """
+        started: float = time.perf_counter()
+        caller: str = self._caller()
+        received: int = self._received_bytes.get(caller, 0)
+        messages: list = self.__receive_many(sender_set, max_messages, timeout)
+        self.__stats.record('receive_many', started, len(messages),
+                            self._received_bytes.get(caller, 0) - received)
+        return messages
 
-        # validate all senders and construct incoming queues for them
-        in_queues: set = set()
-        for sender in sender_set:
-            assert self.channel.sismember('members', sender), 'unknown sender'
-            in_queues.add(self.__queue_key(sender, caller))
+    def __receiver(self, key: bytes) -> str | None:
+        """
+        Parse the receiver id of a queue, inbox or stream key of the namespace.
+        :param key: redis key
+        :return: receiver id or None if the key is not a queue key
+        """
+        name: str = key.decode()[len(self._key('')):]
+        if name.startswith('inbox:'):
+            # strip the priority of lanes
+            return name[len('inbox:'):].split(':')[0]
+        try:
+            receiver = ast.literal_eval(name)[1]
+        except (ValueError, SyntaxError, TypeError, KeyError, IndexError):
+            return None
+        return receiver
 
-        # block until new msg appears on one of the queues
-        result = self.channel.blpop(in_queues, timeout)
+    def reap(self) -> dict[str, int]:
+        """
+        Delete all queues (inboxes, streams) of receivers that are no longer members, including unread messages
+        (counting down the stored envelopes and shared memory segments they refer to).
+        :return: dict with the number of deleted queues ('queues') and the memory they used in bytes ('bytes')
+        """
+        members: set = self.__member_set(refresh=True)
+        queues: int = 0
+        reclaimed: int = 0
+        # only keys of the type of the queues (other keys, e.g. of another application, might match the patterns)
+        queue_type: str = 'stream' if self.streams else 'list'
+        # scan each shard once (the meta shard might also be one of them)
+        for shard in {id(shard): shard for shard in self.__shards}.values():
+            orphans: list = []
+            for pattern in (_glob_escape(self._key('')) + '[[]*', _glob_escape(self._key('inbox:')) + '*'):
+                for key in shard.scan_iter(match=pattern, count=1000, _type=queue_type):
+                    receiver: str | None = self.__receiver(key)
+                    if receiver is not None and receiver not in members:
+                        orphans.append(key)
+            if not orphans:
+                continue
+            # measure and read all orphaned queues in one round trip and delete them in another one
+            with shard.pipeline(transaction=False) as pipe:
+                for key in orphans:
+                    pipe.memory_usage(key)
+                    if self.streams:
+                        pipe.xrange(key)
+                    else:
+                        pipe.lrange(key, 0, -1)
+                results: list = pipe.execute()
+            sizes: list = results[0::2]
+            if self.streams:
+                envelopes: list = [fields[b'm'] for entries in results[1::2] for _, fields in entries]
+            else:
+                envelopes = [envelope for entries in results[1::2] for envelope in entries]
+            queues += shard.unlink(*orphans)
+            # release what the unread messages refer to
+            self.__release(shard, envelopes)
+            reclaimed += sum(size or 0 for size in sizes)
+
+        self.__stats.increment('reaped_queues', queues)
+        self.__stats.increment('reaped_bytes', reclaimed)
+        self.logger.info("Reaped {} queues ({} bytes)".format(queues, reclaimed))
+        return {'queues': queues, 'bytes': reclaimed}
+
+    def __start_reaper(self) -> threading.Thread:
+        """
+        Start a daemon thread calling reap every reap_interval seconds.
+        :return: the started thread
+        """
+        def run():
+            while True:
+                time.sleep(self.reap_interval)
+                try:
+                    self.reap()
+                except redis.RedisError as error:
+                    self.logger.warning("Reaping failed: {}".format(error))
+
+        thread = threading.Thread(target=run, name='channel-reaper', daemon=True)
+        thread.start()
+        return thread
+
+    def _queue_depths(self, caller: str) -> dict[str, int] | None:
+        """
+        Sample the number of waiting messages in the incoming queues (or inbox) of the caller in one round trip.
+        :param caller: receiver id
+        :return: dict of queue key and depth (None if the queues can not be sampled)
+        """
+        keys: list = self._in_keys(caller, sorted(self.__member_set()))
+        if self.streams:
+            return self.__stream_depths(caller, keys)
+        with self.__shard(caller).pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.llen(key)
+            depths: list = pipe.execute()
+        return dict(zip(keys, depths))
+
+    def __stream_depths(self, caller: str, keys: list) -> dict[str, int]:
+        """
+        Sample the number of messages not yet delivered to the caller from its incoming streams (streams mode).
+        Streams keep delivered entries, so the depth is the lag of the consumer group (all entries of streams
+        without a group yet).
+        :param caller: receiver id
+        :param keys: stream keys
+        :return: dict of stream key and depth
+        """
+        shard = self.__shard(caller)
+        with shard.pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.xinfo_groups(key)
+                pipe.xlen(key)
+            results: list = pipe.execute(raise_on_error=False)
+        depths: dict = {}
+        for key, groups, length in zip(keys, results[::2], results[1::2]):
+            group: dict | None = None
+            if not isinstance(groups, redis.ResponseError):  # streams that were never written have no groups
+                group = next((g for g in groups if g['name'] in (STREAM_GROUP, STREAM_GROUP.encode())), None)
+            if group is None:
+                depths[key] = length
+            elif group['lag'] is not None:
+                depths[key] = group['lag']
+            else:
+                # redis can not compute the lag after entries were deleted, count the undelivered ones instead
+                last: str = group['last-delivered-id'].decode()
+                depths[key] = len(shard.xrange(key, min='(' + last, max='+'))
+        return depths
+
+    def _record(self, operation: str, started: float, messages: int = 1, nbytes: int = 0) -> None:
+        """
+        Record a finished operation in the statistics of the channel (for subclasses implementing operations).
+        :param operation: name of the operation (e.g. 'send_to')
+        :param started: start time of the operation (time.perf_counter)
+        :param messages: number of messages sent or received
+        :param nbytes: number of envelope bytes sent or received
+        :return: None
+        """
+        self.__stats.record(operation, started, messages, nbytes)
+
+    def stats(self) -> dict:
+        """
+        Take a snapshot of the statistics of the channel: calls, messages, envelope bytes and latency histograms
+        per operation ('operations'), plain counters ('counters') and, if the caller is a member (bound or handle),
+        its id ('member') and the depths of its incoming queues ('queues').
+        Bytes of received messages are counted when they are taken off redis (also if buffered locally first).
+        :return: JSON serializable dict
+        """
+        snapshot: dict = self.__stats.snapshot()
+        snapshot['time'] = time.time()
+        caller: str | None = self._caller(required=False)
+        if caller is not None:
+            snapshot['member'] = caller
+            depths: dict | None = self._queue_depths(caller)
+            if depths is not None:
+                snapshot['queues'] = depths
+        return snapshot
+
+
+class AsyncChannel(_ChannelBase):
+    """
+    AsyncChannel provides the Channel API (join, leave, exists, subgroup, send and receive operations)
+    as coroutines on top of redis.asyncio. It uses the same redis data structures and envelopes as Channel,
+    so members of both kinds can communicate with each other (including stored broadcast envelopes and
+    shared memory segments).
+
+    Blocking receive operations only suspend the calling task instead of an OS thread. All AsyncChannel
+    instances of a process connecting to the same redis server (and event loop) share one connection pool, so a single
+    process (and event loop) can host hundreds of members (one instance each) or outstanding requests.
+    Instances should be created within the event loop they are used in (or given an asyncio client as connection).
+    Priority lanes work like those of Channel (all members of a channel have to use the same number of lanes).
+    Like bind of Channel, bind associates the member with the os pid. Handles returned by member act on behalf
+    of other members, so concurrent tasks can act as different members of the same instance.
+    """
+
+    def __init__(self, n_bits: int = 5, host_ip: str = 'localhost', port_no: int = 6379, inbox: bool = False,
+                 codec: Codec | None = None, compression: str | None = None, compress_threshold: int = 16384,
+                 unix_socket_path: str | None = None, namespace: str = '', priorities: int = 1, connection=None):
+        super().__init__(n_bits, inbox, codec, compression, compress_threshold, namespace, priorities)
+        # create redis client on the shared connection pool of the process (connections can not be
+        # shared across event loops, so instances created in different loops use different pools)
+        # unless another asyncio client is given
+        if connection is None:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                loop = None
+            connection = redis.asyncio.StrictRedis(
+                connection_pool=_pool(redis.asyncio, loop, host_ip, port_no, unix_socket_path))
+        self.channel = connection
+        # background task receiving membership notifications (started on first use of the cache)
+        self.__membership_task: asyncio.Task | None = None
+        self.__pubsub = None
+
+    async def close(self) -> None:
+        """
+        Stop receiving membership notifications (the shared connection pool stays open).
+        :return: None
+        """
+        if self.__membership_task is not None:
+            self.__membership_task.cancel()
+            await self.__pubsub.aclose()
+            self.__membership_task = None
+
+    async def __watch_membership(self) -> None:
+        """
+        Subscribe to membership notifications (once, or again after they failed) so local views get
+        invalidated on changes.
+        :return: None
+        """
+        if self.__membership_task is not None and self.__membership_task.done():
+            await self.__pubsub.aclose()
+            self.__membership_task = None
+        if self.__membership_task is None:
+            self.__pubsub = self.channel.pubsub(ignore_subscribe_messages=True)
+            await self.__pubsub.subscribe(**{self._key(MEMBERSHIP_TOPIC): self._invalidate_membership})
+            self.__membership_task = asyncio.create_task(self.__pubsub.run())
+            self.__membership_task.add_done_callback(self.__membership_failed)
+
+    def __membership_failed(self, task: asyncio.Task) -> None:
+        """
+        Handle the end of the notification task: if it failed (e.g. on a dropped connection), notifications
+        might have been missed, so drop the local views (the next use of the views subscribes again).
+        :param task: the notification task
+        :return: None
+        """
+        if task.cancelled():
+            return
+        self.logger.warning("Membership notifications failed: {}".format(task.exception()))
+        self._invalidate_membership()
+
+    async def __member_set(self, refresh: bool = False) -> set:
+        """
+        Retrieve the global member set from the local view, reading it from redis only if invalidated.
+        :param refresh: force a re-read of the member set
+        :return: set of member ids
+        """
+        members = self._members
+        if members is None or refresh:
+            await self.__watch_membership()
+            generation: int = self._membership_generation
+            members = self._decode_set(await self.channel.smembers(self._key('members')))
+            # a change notified while reading might not be contained in the result
+            if generation == self._membership_generation:
+                self._members = members
+        return members
+
+    async def __is_member(self, pid: str) -> bool:
+        """
+        Validate a member id against the local view (re-reading it once if the id is unknown).
+        :param pid: member id
+        :return: boolean value, true if pid is a member
+        """
+        return pid in await self.__member_set() or pid in await self.__member_set(refresh=True)
+
+    async def __claim_id(self) -> str:
+        """
+        Atomically claim a new/unused random member id in the global member set (see Channel).
+        :return: claimed member id
+        """
+        for _ in range(CLAIM_PROBES):
+            pid: str = str(random.randrange(self.MAXPROC))
+            if await self.channel.sadd(self._key('members'), pid):
+                return pid
+        while True:
+            members: set = self._decode_set(await self.channel.smembers(self._key('members')))
+            assert len(members) < self.MAXPROC, 'no member id left'
+            pid = random.choice([str(i) for i in range(self.MAXPROC) if str(i) not in members])
+            if await self.channel.sadd(self._key('members'), pid):
+                return pid
+
+    async def join(self, subgroup: str) -> str:
+        """
+        Join as a member to the global channel and associate it with a (sub)group (see Channel).
+        :param subgroup: an identifier for the grouping
+        :return: global member id
+        """
+        new_pid: str = await self.__claim_id()
+        self.logger.info("Member {} joining {}.".format(new_pid, subgroup))
+        members: set = self._decode_set(await self.channel.smembers(self._key('members'))) - {new_pid}
+
+        async with self.channel.pipeline() as pipe:
+            pipe.sadd(self._key(subgroup), new_pid)
+            if len(members) > 0:
+                pipe.sadd(self._key('xchan'), *self._queue_keys(new_pid, members))
+            pipe.publish(self._key(MEMBERSHIP_TOPIC), subgroup)
+            await pipe.execute()
+        return new_pid
+
+    async def leave(self, subgroup: str):
+        """
+        Unregister the calling member from the global channel (and subgroup).
+        :param subgroup: subgroup identifier
+        :return: None
+        """
+        pid: str = self._caller()
+        assert await self.channel.sismember(self._key('members'), pid), 'member unknown'
+        self.logger.info("Member {} leaving {}".format(pid, subgroup))
+
+        self._forget(pid)
+        async with self.channel.pipeline() as pipe:
+            pipe.srem(self._key('members'), pid)
+            pipe.smembers(self._key('members'))
+            members: set = self._decode_set((await pipe.execute())[-1])
+
+        async with self.channel.pipeline() as pipe:
+            if len(members) > 0:
+                pipe.srem(self._key('xchan'), *self._queue_keys(pid, members))
+            pipe.srem(self._key(subgroup), pid)
+            pipe.publish(self._key(MEMBERSHIP_TOPIC), subgroup)
+            await pipe.execute()
+
+    def member(self, pid: str) -> 'AsyncMember':
+        """
+        Create a handle acting on behalf of a member (instead of the member bound to the os pid).
+        :param pid: member id (e.g. as returned by join)
+        :return: member handle
+        """
+        return AsyncMember(self, pid)
+
+    async def exists(self, pid: str) -> bool:
+        """
+        Check if pid is in global member set
+        :param pid: process identifier
+        :return: boolean value, true if pid is a member
+        """
+        # ids are compared as strings (like redis does)
+        return await self.__is_member(str(pid))
+
+    async def subgroup(self, subgroup: str) -> set:
+        """
+        Retrieve members of a subgroup.
+        :param subgroup: subgroup string identifier
+        :return: set of member process identifiers
+        """
+        members = self._subgroups.get(subgroup)
+        if members is None:
+            await self.__watch_membership()
+            generation: int = self._membership_generation
+            members = self._decode_set(await self.channel.smembers(self._key(subgroup)))
+            if generation == self._membership_generation:
+                self._subgroups[subgroup] = members
+        return set(members)
+
+    async def __push(self, caller: str, destinations, message: object, priority: int) -> None:
+        """
+        Push a message to the incoming queues of all destinations in one round trip.
+        :param caller: sender id
+        :param destinations: iterable of receiver ids
+        :param message: the message object to be send
+        :param priority: priority lane
+        :return: None
+        """
+        assert 0 <= priority < self.priorities, 'unknown priority'
+        envelope: bytes = self._encode(caller, message)
+        async with self.channel.pipeline(transaction=False) as pipe:
+            for destination in destinations:
+                pipe.rpush(self._out_key(caller, destination, priority), envelope)
+            await pipe.execute()
+
+    async def _dereference(self, key: bytes) -> bytes | None:
+        """
+        Load an envelope stored once for all receivers and count down its references (deleting it after the last one).
+        :param key: redis key of the stored envelope
+        :return: envelope bytes or None if the envelope expired
+        """
+        async with self.channel.pipeline(transaction=False) as pipe:
+            pipe.hget(key, 'e')
+            pipe.hincrby(key, 'r', -1)
+            envelope, references = await pipe.execute()
+        if references <= 0:
+            await self.channel.unlink(key)
+        return envelope
+
+    async def _attach(self, handle: bytes) -> bytes | None:
+        """
+        Copy an envelope out of a shared memory segment and count down its references
+        (unlinking the segment after the last one). Unlike Channel, the message is not decoded from the
+        segment in place (no zero-copy): the copy is taken before the segment is closed.
+        :param handle: size and name of the segment
+        :return: envelope bytes or None if the segment is gone
+        """
+        (size,) = _SHARED_HANDLE.unpack_from(handle)
+        name: str = handle[_SHARED_HANDLE.size:].decode()
+        try:
+            segment = shared_memory.SharedMemory(name=name, track=False)
+        except FileNotFoundError:
+            return None
+        envelope: bytes = bytes(segment.buf[:size])
+        segment.close()
+        if await self.channel.hincrby(self._key('shm:' + name), 'r', -1) <= 0:
+            await self.channel.unlink(self._key('shm:' + name))
+            segment.unlink()
+        return envelope
+
+    async def __resolve(self, envelopes: list) -> list:
+        """
+        Replace references and shared memory handles in envelopes taken off the queues by the envelopes
+        they refer to (see _decode).
+        :param envelopes: list of envelope bytes
+        :return: list of envelope bytes (without expired ones)
+        """
+        resolved: list = []
+        for envelope in envelopes:
+            flags, _, offset = self._header(envelope)
+            if flags & REFERENCE_FLAG:
+                envelope = await self._dereference(envelope[offset:])
+            elif flags & SHARED_FLAG:
+                envelope = await self._attach(envelope[offset:])
+            if envelope is not None:
+                resolved.append(envelope)
+        return resolved
+
+    async def __pop(self, caller: str, keys: list, timeout: int) -> tuple[str, Any] | None:
+        """
+        Take the next message off the first non-empty one of the callers' queues, dropping expired messages.
+        :param caller: receiver id
+        :param keys: queue keys
+        :param timeout: optional timeout for blocking read (0 blocks forever)
+        :return: tuple of sender id and message or None on timeout
+        """
+        deadline: float = time.monotonic() + timeout
+        while True:
+            remaining: float = 0 if timeout == 0 else deadline - time.monotonic()
+            if timeout != 0 and remaining <= 0:
+                return None
+            result = await self.channel.blpop(keys, remaining)
+            if result is None:
+                return None
+            messages: list = self._decode_all(caller, await self.__resolve([result[1]]))
+            if messages:
+                return messages[0]
+
+    async def __pop_inbox(self, caller: str, sender_set: set | None, timeout: int) -> tuple[str, Any] | None:
+        """
+        Take the next message from one of the senders off the local buffer or the callers' inbox (inbox mode).
+        :param caller: receiver id
+        :param sender_set: set of sender ids or None for any sender
+        :param timeout: optional timeout for blocking read (0 blocks forever)
+        :return: tuple of sender id and message or None on timeout
+        """
+        buffered: list = self._take_pending(caller, sender_set, 1)
+        if buffered:
+            return buffered[0]
+
+        deadline: float = time.monotonic() + timeout
+        while True:
+            remaining: float = 0 if timeout == 0 else deadline - time.monotonic()
+            if timeout != 0 and remaining <= 0:
+                return None
+            result = await self.channel.blpop(self._in_keys(caller, None), remaining)
+            if result is None:
+                return None
+            messages: list = self._filter(caller, sender_set, await self.__resolve([result[1]]))
+            if messages:
+                return messages[0]
+
+    async def __receive(self, caller: str, sender_set: set | None, timeout: int) -> tuple[str, Any] | None:
+        """
+        Take the next message from one of the senders (or any sender) off the callers' queues.
+        :param caller: receiver id
+        :param sender_set: set of sender ids or None for any sender
+        :param timeout: optional timeout for blocking read (0 blocks forever)
+        :return: tuple of sender id and message or None on timeout
+        """
+        if self.inbox:
+            result = await self.__pop_inbox(caller, sender_set, timeout)
+        else:
+            senders = await self.__member_set() if sender_set is None else sender_set
+            result = await self.__pop(caller, self._in_keys(caller, senders), timeout)
         if result is not None:
-            # extract sender id from key part
-            key: str = result[0].decode()
-            sender: str = key.split("'")[1]
-            # deserialize msg content
-            message = pickle.loads(result[1])
-            # log and return results
-            self.logger.debug("{} received {} from {}".format(caller, message, sender))
-            return sender, message
+            self.logger.debug("{} received {} from {}".format(caller, result[1], result[0]))
+        return result
+
+    async def send_to(self, destination_set: set, message: object, priority: int = NORMAL_PRIORITY) -> None:
+        """
+        Sends an asynchronous, persistent multicast message.
+        :param destination_set: a set of member identifiers
+        :param message: the message object to be send
+        :param priority: priority lane (channels with several priorities only)
+        :return: None
+        """
+        assert all(type(k) is str for k in destination_set), 'type error'
+
+        caller: str = self._caller()
+        assert await self.__is_member(caller), 'unknown sender'
+        self.logger.debug("{} sends {} to {}".format(caller, message, destination_set))
+
+        for destination in destination_set:
+            assert await self.__is_member(destination), 'unknown receiver'
+        await self.__push(caller, destination_set, message, priority)
+
+    async def send_to_all(self, message: object, priority: int = NORMAL_PRIORITY) -> None:
+        """
+        Sends an asynchronous, persistent broadcast message to all currently registered members.
+        :param message: the message object to be send
+        :param priority: priority lane (channels with several priorities only)
+        :return: None
+        """
+        caller: str = self._caller()
+        assert await self.__is_member(caller), 'unknown sender'
+        self.logger.debug("{} sends {} to all members".format(caller, message))
+        await self.__push(caller, await self.__member_set(), message, priority)
+
+    async def receive_from_any(self, timeout: int = 0) -> tuple[str, Any] | None:
+        """
+        Wait for the next message off any of the callers' incoming queues.
+        :param timeout: optional timeout for blocking read.
+        :return: tuple of sender id and message or None on timeout
+        """
+        caller: str = self._caller()
+        assert await self.__is_member(caller), 'unknown receiver'
+        return await self.__receive(caller, None, timeout)
+
+    async def receive_from(self, sender_set: set, timeout: int = 0) -> tuple[str, Any] | None:
+        """
+        Wait for the next message off the callers' queues from the members specified in the sender_set.
+        :param sender_set: set of ids to watch respective incoming queues for a new message
+        :param timeout: optional timeout for blocking call
+        :return: tuple of sender id and message or None on timeout
+        """
+        caller: str = self._caller()
+        assert await self.__is_member(caller), 'unknown receiver'
+        for sender in sender_set:
+            assert await self.__is_member(sender), 'unknown sender'
+        return await self.__receive(caller, set(sender_set), timeout)
+
+    async def receive_many(self, sender_set: set | None = None, max_messages: int = 100,
+                           timeout: int = 0) -> list[tuple[str, Any]]:
+        """
+        Wait for the next message like receive_from or receive_from_any and then take up to
+        max_messages - 1 further messages that are already waiting without blocking (see Channel).
+        :param sender_set: set of ids to watch respective incoming queues for or None for all members
+        :param max_messages: maximum number of messages to return
+        :param timeout: optional timeout for blocking on the first message
+        :return: list of tuples of sender id and message, empty on timeout
+        """
+        assert max_messages > 0, 'max_messages must be positive'
+
+        caller: str = self._caller()
+        assert await self.__is_member(caller), 'unknown receiver'
+        if sender_set is not None:
+            for sender in sender_set:
+                assert await self.__is_member(sender), 'unknown sender'
+            sender_set = set(sender_set)
+
+        messages: list = self._take_pending(caller, sender_set, max_messages) if self.inbox else []
+        if len(messages) == 0:
+            result = await self.__receive(caller, sender_set, timeout)
+            if result is None:
+                return []
+            messages.append(result)
+
+        senders = None if self.inbox else (await self.__member_set() if sender_set is None else sender_set)
+        in_queues: list = self._in_keys(caller, senders)
+        while len(messages) < max_messages:
+            result = await self.channel.lmpop(len(in_queues), *in_queues,
+                                              direction='LEFT', count=max_messages - len(messages))
+            if result is None:
+                break
+            envelopes: list = await self.__resolve(result[1])
+            if self.inbox:
+                messages += self._filter(caller, sender_set, envelopes)
+            else:
+                messages += self._decode_all(caller, envelopes)
+        return messages
+
+
+class Member:
+    """
+    Member handle of a Channel (see Channel.member), providing the send and receive operations of the channel
+    on behalf of its member. Handles can be used from any thread, also concurrently to handles of other members.
+    """
+
+    def __init__(self, channel: Channel, pid: str):
+        self.channel: Channel = channel
+        self.pid: str = pid
+
+    def __repr__(self) -> str:
+        return 'Member({})'.format(self.pid)
+
+    def __call(self, operation, *args):
+        # the member only applies within the current thread (context) while the operation runs
+        token = _current_member.set((self.channel, self.pid))
+        try:
+            return operation(*args)
+        finally:
+            _current_member.reset(token)
+
+    def leave(self, subgroup: str) -> None:
+        return self.__call(self.channel.leave, subgroup)
+
+    def send_to(self, destination_set: set, message: object, priority: int = NORMAL_PRIORITY) -> None:
+        return self.__call(self.channel.send_to, destination_set, message, priority)
+
+    def send_to_all(self, message: object, priority: int = NORMAL_PRIORITY) -> None:
+        return self.__call(self.channel.send_to_all, message, priority)
+
+    def receive_from_any(self, timeout: int = 0) -> tuple[str, Any] | None:
+        return self.__call(self.channel.receive_from_any, timeout)
+
+    def receive_from(self, sender_set: set, timeout: int = 0) -> tuple[str, Any] | None:
+        return self.__call(self.channel.receive_from, sender_set, timeout)
+
+    def receive_many(self, sender_set: set | None = None, max_messages: int = 100,
+                     timeout: int = 0) -> list[tuple[str, Any]]:
+        return self.__call(self.channel.receive_many, sender_set, max_messages, timeout)
+
+    def ack(self) -> None:
+        return self.__call(self.channel.ack)
+
+    def reclaim(self, min_idle_time: int = 60000, max_messages: int = 100) -> list[tuple[str, Any]]:
+        return self.__call(self.channel.reclaim, min_idle_time, max_messages)
+
+    def stats(self) -> dict:
+        return self.__call(self.channel.stats)
+
+
+class AsyncMember:
+    """
+    Member handle of an AsyncChannel (see AsyncChannel.member), providing the send and receive coroutines
+    of the channel on behalf of its member. Handles can be used from any task, also concurrently to handles
+    of other members.
+    """
+
+    def __init__(self, channel: AsyncChannel, pid: str):
+        self.channel: AsyncChannel = channel
+        self.pid: str = pid
+
+    def __repr__(self) -> str:
+        return 'AsyncMember({})'.format(self.pid)
+
+    async def __call(self, operation, *args):
+        # the member only applies within the current task (context) while the operation runs
+        token = _current_member.set((self.channel, self.pid))
+        try:
+            return await operation(*args)
+        finally:
+            _current_member.reset(token)
+
+    async def leave(self, subgroup: str) -> None:
+        return await self.__call(self.channel.leave, subgroup)
+
+    async def send_to(self, destination_set: set, message: object, priority: int = NORMAL_PRIORITY) -> None:
+        return await self.__call(self.channel.send_to, destination_set, message, priority)
+
+    async def send_to_all(self, message: object, priority: int = NORMAL_PRIORITY) -> None:
+        return await self.__call(self.channel.send_to_all, message, priority)
+
+    async def receive_from_any(self, timeout: int = 0) -> tuple[str, Any] | None:
+        return await self.__call(self.channel.receive_from_any, timeout)
+
+    async def receive_from(self, sender_set: set, timeout: int = 0) -> tuple[str, Any] | None:
+        return await self.__call(self.channel.receive_from, sender_set, timeout)
+
+    async def receive_many(self, sender_set: set | None = None, max_messages: int = 100,
+                           timeout: int = 0) -> list[tuple[str, Any]]:
+        return await self.__call(self.channel.receive_many, sender_set, max_messages, timeout)
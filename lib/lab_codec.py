@@ -0,0 +1,159 @@
+import lzma
+import pickle
+import struct
+import zlib
+from typing import Any
+
+try:
+    import msgpack
+except ImportError:  # optional dependency, only needed by MsgpackCodec
+    msgpack = None
+
+try:
+    import lz4.frame
+except ImportError:  # optional dependency, only needed for lz4 compression
+    lz4 = None
+
+# Ids of compression algorithms as stored in message envelopes (0 means uncompressed)
+COMPRESSION_IDS = {'zlib': 1, 'lzma': 2, 'lz4': 3}
+
+
+def compress(data: bytes, algorithm: str) -> bytes:
+    """
+    Compress serialized message data.
+    :param data: serialized message (any bytes-like object)
+    :param algorithm: name of the compression algorithm (see COMPRESSION_IDS)
+    :return: compressed data
+    """
+    match algorithm:
+        case 'zlib':
+            return zlib.compress(data, 1)  # favour speed over ratio
+        case 'lzma':
+            return lzma.compress(data)
+        case 'lz4':
+            if lz4 is None:
+                raise ImportError('lz4 compression requires the lz4 package')
+            return lz4.frame.compress(data)
+        case _:
+            raise ValueError('Unknown compression algorithm: {}'.format(algorithm))
+
+
+def decompress(data: bytes, compression_id: int) -> bytes:
+    """
+    Decompress serialized message data.
+    :param data: compressed data (any bytes-like object)
+    :param compression_id: id of the compression algorithm (see COMPRESSION_IDS)
+    :return: serialized message
+    """
+    match compression_id:
+        case 1:
+            return zlib.decompress(data)
+        case 2:
+            return lzma.decompress(data)
+        case 3:
+            if lz4 is None:
+                raise ImportError('lz4 compression requires the lz4 package')
+            return lz4.frame.decompress(data)
+        case _:
+            raise ValueError('Unknown compression id: {}'.format(compression_id))
+
+
+class Codec:
+    """
+    A codec serializes message objects to bytes and back.
+    Codecs are chosen per channel, all members of a channel have to use the same codec.
+    """
+
+    def encode(self, message: Any) -> bytes:
+        """
+        Serialize a message object.
+        :param message: the message object
+        :return: serialized message (any bytes-like object)
+        """
+        raise NotImplementedError
+
+    def decode(self, data: bytes) -> Any:
+        """
+        Deserialize a message object.
+        :param data: serialized message (any bytes-like object)
+        :return: the message object
+        """
+        raise NotImplementedError
+
+
+class PickleCodec(Codec):
+    """
+    Serializes arbitrary python objects with pickle (default codec).
+    """
+
+    def __init__(self, protocol: int = pickle.DEFAULT_PROTOCOL):
+        self.protocol: int = protocol
+
+    def encode(self, message: Any) -> bytes:
+        return pickle.dumps(message, protocol=self.protocol)
+
+    def decode(self, data: bytes) -> Any:
+        return pickle.loads(data)
+
+
+class Pickle5Codec(Codec):
+    """
+    Serializes arbitrary python objects with pickle protocol 5 and out-of-band buffers.
+
+    Objects supporting PickleBuffer (e.g. bytearray or numpy arrays) are not copied into the pickle stream
+    but appended as raw buffers. On decoding, these buffers are handed to pickle as views on the received
+    bytes, so large payloads are reconstructed without further copies.
+
+    Frame format: <n> <len_pickle> <len_buffer_1> .. <len_buffer_n> <pickle> <buffer_1> .. <buffer_n>
+    (all lengths as unsigned 64-bit integers in network byte order, n as unsigned 32-bit integer)
+    """
+
+    def encode(self, message: Any) -> bytes:
+        buffers: list = []
+        data: bytes = pickle.dumps(message, protocol=5, buffer_callback=buffers.append)
+        raw: list = [buffer.raw() for buffer in buffers]
+        header: bytes = struct.pack('!IQ{}Q'.format(len(raw)), len(raw), len(data), *(r.nbytes for r in raw))
+        return b''.join([header, data] + raw)
+
+    def decode(self, data: bytes) -> Any:
+        view = memoryview(data)
+        (n,) = struct.unpack_from('!I', view)
+        lengths = struct.unpack_from('!{}Q'.format(n + 1), view, 4)
+        offset: int = 4 + 8 * (n + 1)
+        # slice pickle stream and buffers off the frame without copying
+        parts: list = []
+        for length in lengths:
+            parts.append(view[offset:offset + length])
+            offset += length
+        return pickle.loads(parts[0], buffers=parts[1:])
+
+
+class MsgpackCodec(Codec):
+    """
+    Serializes messages made of basic types (None, bool, int, float, str, bytes, tuples/lists, dicts) with msgpack.
+    Requires the optional msgpack package. Sequences are decoded as tuples (the common message format of the labs).
+    """
+
+    def __init__(self):
+        if msgpack is None:
+            raise ImportError('MsgpackCodec requires the msgpack package')
+
+    def encode(self, message: Any) -> bytes:
+        return msgpack.packb(message, use_bin_type=True)
+
+    def decode(self, data: bytes) -> Any:
+        return msgpack.unpackb(data, raw=False, use_list=False)
+
+
+class RawCodec(Codec):
+    """
+    Passes bytes-like messages through unchanged (for applications doing their own serialization).
+    """
+
+    def encode(self, message: Any) -> bytes:
+        assert isinstance(message, (bytes, bytearray, memoryview)), 'raw messages need to be bytes-like'
+        # redis accepts bytes and memoryviews as they are
+        return bytes(message) if isinstance(message, bytearray) else message
+
+    def decode(self, data: bytes) -> Any:
+        return data if isinstance(data, bytes) else bytes(data)
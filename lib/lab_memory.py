@@ -0,0 +1,302 @@
+import fnmatch
+import re
+import threading
+import time
+from multiprocessing.managers import BaseManager, MakeProxyType
+
+
+def _encode(value) -> bytes:
+    """ Convert keys and values to bytes (like redis does) """
+    if isinstance(value, bytes):
+        return value
+    if isinstance(value, (bytearray, memoryview)):
+        return bytes(value)
+    return str(value).encode()
+
+
+# Python types of the values of the redis types a MemoryStore supports
+_TYPES: dict[str, type] = {'set': set, 'list': list, 'hash': dict}
+
+
+class MemoryStore:
+    """
+    MemoryStore keeps sets, lists and hashes in process memory and implements the subset of the redis client API
+    used by lab_channel.Channel (same method names, arguments and result types as redis-py).
+    It can replace the redis server for channels of a single process (pass it as connection to Channel)
+    or, shared via MemoryManager, for channels of several processes on the same host.
+
+    All commands are thread-safe. Blocking pops wait on a condition variable that is notified by pushes.
+    """
+
+    def __init__(self):
+        self.__data: dict[bytes, set | list | dict] = {}
+        self.__cond = threading.Condition()
+
+    # Pipelines
+
+    def pipeline(self, transaction: bool = True) -> 'MemoryPipeline':
+        """
+        Create a pipeline buffering commands until execute (all commands of a pipeline run atomically).
+        :param transaction: ignored, pipelines are always atomic
+        :return: pipeline object
+        """
+        return MemoryPipeline(self)
+
+    def execute(self, commands: list) -> list:
+        """
+        Run a batch of commands atomically (used by pipelines).
+        :param commands: list of tuples of method name, positional and keyword arguments
+        :return: list of command results
+        """
+        with self.__cond:
+            return [getattr(self, name)(*args, **kwargs) for name, args, kwargs in commands]
+
+    # Keys
+
+    def flushall(self) -> bool:
+        with self.__cond:
+            self.__data.clear()
+        return True
+
+    def delete(self, *keys) -> int:
+        with self.__cond:
+            return sum(self.__data.pop(_encode(key), None) is not None for key in keys)
+
+    def exists(self, *keys) -> int:
+        with self.__cond:
+            return sum(_encode(key) in self.__data for key in keys)
+
+    def unlink(self, *keys) -> int:
+        return self.delete(*keys)
+
+    def keys(self, pattern='*') -> list:
+        assert pattern == '*', 'only * is supported'
+        with self.__cond:
+            return list(self.__data)
+
+    def scan_iter(self, match='*', count: int | None = None, _type: str | None = None) -> list:
+        """
+        Retrieve all keys matching a glob-style pattern (at once, unlike redis-py, so proxies can return them).
+        :param match: pattern
+        :param count: ignored
+        :param _type: optional type of the values of the keys ('set', 'list' or 'hash')
+        :return: list of keys
+        """
+        # redis escapes special characters with a backslash, fnmatch with brackets
+        pattern: bytes = re.sub(rb'\\(.)', rb'[\1]', _encode(match))
+        # unknown types (like stream) match no key
+        value_type: type | None = None if _type is None else _TYPES.get(_type, type(None))
+        with self.__cond:
+            return [key for key, value in self.__data.items()
+                    if fnmatch.fnmatchcase(key, pattern) and (value_type is None or isinstance(value, value_type))]
+
+    # Sets
+
+    def sadd(self, key, *values) -> int:
+        with self.__cond:
+            members: set = self.__data.setdefault(_encode(key), set())
+            size: int = len(members)
+            members.update(_encode(value) for value in values)
+            return len(members) - size
+
+    def srem(self, key, *values) -> int:
+        with self.__cond:
+            members: set = self.__data.get(_encode(key), set())
+            size: int = len(members)
+            members.difference_update(_encode(value) for value in values)
+            if not members:
+                self.__data.pop(_encode(key), None)
+            return size - len(members)
+
+    def smembers(self, key) -> set:
+        with self.__cond:
+            return set(self.__data.get(_encode(key), set()))
+
+    def sismember(self, key, value) -> bool:
+        with self.__cond:
+            return _encode(value) in self.__data.get(_encode(key), set())
+
+    def scard(self, key) -> int:
+        with self.__cond:
+            return len(self.__data.get(_encode(key), set()))
+
+    # Lists
+
+    def rpush(self, key, *values) -> int:
+        with self.__cond:
+            items: list = self.__data.setdefault(_encode(key), [])
+            items.extend(_encode(value) for value in values)
+            self.__cond.notify_all()
+            return len(items)
+
+    def llen(self, key) -> int:
+        with self.__cond:
+            return len(self.__data.get(_encode(key), []))
+
+    def ltrim(self, key, start: int, end: int) -> bool:
+        with self.__cond:
+            key = _encode(key)
+            items: list = self.__data.get(key, [])
+            # redis includes the end index, negative indices count from the end
+            size: int = len(items)
+            start, end = max(start + size if start < 0 else start, 0), (end + size if end < 0 else end) + 1
+            items[:] = items[start:max(end, start)]
+            if not items:
+                self.__data.pop(key, None)
+            return True
+
+    def lrange(self, key, start: int, end: int) -> list:
+        with self.__cond:
+            items: list = self.__data.get(_encode(key), [])
+            # redis includes the end index, negative indices count from the end
+            size: int = len(items)
+            start, end = max(start + size if start < 0 else start, 0), (end + size if end < 0 else end) + 1
+            return items[start:max(end, start)]
+
+    def lpop(self, key, count: int | None = None):
+        with self.__cond:
+            key = _encode(key)
+            items: list = self.__data.get(key)
+            if not items:
+                return None
+            n: int = 1 if count is None else count
+            popped, items[:n] = items[:n], []
+            if not items:
+                del self.__data[key]
+            return popped[0] if count is None else popped
+
+    def lmpop(self, num_keys: int, *args, direction: str = 'LEFT', count: int = 1):
+        assert direction == 'LEFT', 'only LEFT is supported'
+        with self.__cond:
+            for key in args[:num_keys]:
+                popped = self.lpop(key, count)
+                if popped is not None:
+                    return [_encode(key), popped]
+            return None
+
+    def blpop(self, keys, timeout: float = 0):
+        """
+        Pop the first element of the first non-empty list, waiting up to timeout seconds (0 waits forever).
+        :param keys: list of keys (or a single key)
+        :param timeout: timeout in seconds
+        :return: tuple of key and element or None on timeout
+        """
+        keys = [keys] if isinstance(keys, (str, bytes)) else list(keys)
+        deadline: float = time.monotonic() + timeout
+        with self.__cond:
+            while True:
+                for key in keys:
+                    value = self.lpop(key)
+                    if value is not None:
+                        return _encode(key), value
+                remaining: float | None = None if timeout == 0 else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self.__cond.wait(remaining)
+
+    # Hashes
+
+    def hset(self, key, field=None, value=None, mapping: dict | None = None) -> int:
+        with self.__cond:
+            fields: dict = self.__data.setdefault(_encode(key), {})
+            items: dict = dict(mapping or {})
+            if field is not None:
+                items[field] = value
+            added: int = sum(_encode(name) not in fields for name in items)
+            fields.update((_encode(name), _encode(value)) for name, value in items.items())
+            return added
+
+    def hget(self, key, field):
+        with self.__cond:
+            return self.__data.get(_encode(key), {}).get(_encode(field))
+
+    def hdel(self, key, *fields) -> int:
+        with self.__cond:
+            values: dict = self.__data.get(_encode(key), {})
+            removed: int = sum(values.pop(_encode(field), None) is not None for field in fields)
+            if not values:
+                self.__data.pop(_encode(key), None)
+            return removed
+
+    def hincrby(self, key, field, amount: int = 1) -> int:
+        with self.__cond:
+            fields: dict = self.__data.setdefault(_encode(key), {})
+            value: int = int(fields.get(_encode(field), 0)) + amount
+            fields[_encode(field)] = _encode(value)
+            return value
+
+    # Server
+
+    def memory_usage(self, key) -> int | None:
+        """ Approximate the memory used by a key (bytes of key and elements, no overhead) """
+        with self.__cond:
+            key = _encode(key)
+            if key not in self.__data:
+                return None
+            value = self.__data[key]
+            items = list(value.keys()) + list(value.values()) if isinstance(value, dict) else value
+            return len(key) + sum(len(item) for item in items)
+
+    # Pub/sub (messages are not delivered, channels on memory stores do not cache membership)
+
+    def publish(self, channel, message) -> int:
+        return 0
+
+
+class MemoryPipeline:
+    """
+    Client-side command buffer of a MemoryStore (or MemoryStore proxy) mimicking redis-py pipelines.
+    Commands are collected and run as one atomic batch (and one inter-process call) by execute.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.commands: list = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.commands = []
+
+    def __getattr__(self, name):
+        def command(*args, **kwargs):
+            self.commands.append((name, args, kwargs))
+            return self
+        return command
+
+    def execute(self) -> list:
+        commands, self.commands = self.commands, []
+        return self.store.execute(commands)
+
+
+_MemoryStoreProxyBase = MakeProxyType('_MemoryStoreProxyBase', (
+    'execute', 'flushall', 'delete', 'unlink', 'exists', 'keys', 'scan_iter', 'sadd', 'srem', 'smembers', 'sismember',
+    'scard', 'rpush', 'llen', 'ltrim', 'lrange', 'lpop', 'lmpop', 'blpop', 'hset', 'hget', 'hdel', 'hincrby',
+    'memory_usage', 'publish'))
+
+
+class MemoryStoreProxy(_MemoryStoreProxyBase):
+    """
+    Proxy of a MemoryStore living in a MemoryManager server process.
+    Proxies can be passed to child processes (also with the spawn start method) and used as channel connection.
+    Pipelines are buffered locally and sent to the server as one batch.
+    """
+
+    def pipeline(self, transaction: bool = True) -> MemoryPipeline:
+        return MemoryPipeline(self)
+
+
+class MemoryManager(BaseManager):
+    """
+    Manager serving a shared MemoryStore to the processes of a single host, e.g.
+
+        manager = MemoryManager()
+        manager.start()
+        store = manager.MemoryStore()  # pass to child processes and create Channel(connection=store) there
+
+    Each process talks to the store over a local pipe/socket instead of a TCP connection to a redis server.
+    """
+
+
+MemoryManager.register('MemoryStore', MemoryStore, proxytype=MemoryStoreProxy)
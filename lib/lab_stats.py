@@ -0,0 +1,125 @@
+import bisect
+import json
+import logging
+import threading
+import time
+
+# Upper bounds (in seconds) of the latency histogram buckets (the last bucket takes all slower operations)
+LATENCY_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, float('inf'))
+
+logger = logging.getLogger('vs2lab.stats')
+
+
+class OperationStats:
+    """
+    Counters of a single kind of operation: number of calls, messages and bytes as well as a latency histogram.
+    """
+
+    def __init__(self):
+        self.count: int = 0
+        self.messages: int = 0
+        self.bytes: int = 0
+        self.total_time: float = 0.0
+        self.max_time: float = 0.0
+        self.histogram: list[int] = [0] * len(LATENCY_BUCKETS)
+
+    def add(self, duration: float, messages: int, nbytes: int) -> None:
+        self.count += 1
+        self.messages += messages
+        self.bytes += nbytes
+        self.total_time += duration
+        self.max_time = max(self.max_time, duration)
+        self.histogram[bisect.bisect_left(LATENCY_BUCKETS, duration)] += 1
+
+    def snapshot(self) -> dict:
+        return {
+            'count': self.count,
+            'messages': self.messages,
+            'bytes': self.bytes,
+            'mean_time': self.total_time / self.count if self.count else 0.0,
+            'max_time': self.max_time,
+            'histogram': {'+Inf' if bound == float('inf') else str(bound): n
+                          for bound, n in zip(LATENCY_BUCKETS, self.histogram)},
+        }
+
+
+class ChannelStats:
+    """
+    ChannelStats collects per-operation statistics of a channel (thread-safe).
+    Operations are recorded with their latency, the number of messages and the number of envelope bytes
+    they moved. Plain counters (e.g. overflows of bounded queues) can be incremented as well.
+    """
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__operations: dict[str, OperationStats] = {}
+        self.__counters: dict[str, int] = {}
+
+    def __getstate__(self) -> dict:
+        with self.__lock:
+            return {'operations': self.__operations, 'counters': self.__counters}
+
+    def __setstate__(self, state: dict) -> None:
+        self.__lock = threading.Lock()
+        self.__operations = state['operations']
+        self.__counters = state['counters']
+
+    def record(self, operation: str, started: float, messages: int = 1, nbytes: int = 0) -> None:
+        """
+        Record a finished operation.
+        :param operation: name of the operation (e.g. 'send_to')
+        :param started: start time of the operation (time.perf_counter)
+        :param messages: number of messages sent or received
+        :param nbytes: number of envelope bytes sent or received
+        :return: None
+        """
+        duration: float = time.perf_counter() - started
+        with self.__lock:
+            stats = self.__operations.get(operation)
+            if stats is None:
+                stats = self.__operations[operation] = OperationStats()
+            stats.add(duration, messages, nbytes)
+
+    def increment(self, counter: str, value: int = 1) -> None:
+        """
+        Increment a plain counter.
+        :param counter: name of the counter
+        :param value: increment
+        :return: None
+        """
+        with self.__lock:
+            self.__counters[counter] = self.__counters.get(counter, 0) + value
+
+    def snapshot(self) -> dict:
+        """
+        Take a consistent copy of all statistics.
+        :return: dict with per-operation statistics ('operations') and counters ('counters')
+        """
+        with self.__lock:
+            return {
+                'operations': {name: stats.snapshot() for name, stats in self.__operations.items()},
+                'counters': dict(self.__counters),
+            }
+
+
+def dump_periodically(path: str, interval: float, snapshot) -> threading.Thread:
+    """
+    Append a snapshot as a line of JSON to a file every interval seconds (in a daemon thread).
+    Failing dumps (e.g. an unwritable file) are logged and retried after the next interval.
+    :param path: name of the file
+    :param interval: seconds between two snapshots
+    :param snapshot: callable returning the snapshot (a JSON serializable dict)
+    :return: the started thread
+    """
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                with open(path, 'a', encoding='utf-8') as file:
+                    file.write(json.dumps(snapshot()) + '\n')
+            except Exception as error:  # pylint: disable=broad-exception-caught
+                logger.warning("Dumping stats to {} failed: {}".format(path, error))
+
+    thread = threading.Thread(target=run, name='stats-dump', daemon=True)
+    thread.start()
+    return thread
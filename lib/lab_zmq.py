@@ -0,0 +1,362 @@
+import threading
+import time
+from typing import Any
+
+import redis
+
+try:
+    import zmq
+except ImportError:  # optional dependency, only needed by ZmqChannel
+    zmq = None
+
+from .lab_channel import Channel, NORMAL_PRIORITY
+
+# Seconds a sender waits for the endpoint of a member that just joined (it is advertised right after joining)
+ENDPOINT_WAIT = 5.0
+# Milliseconds sockets keep trying to deliver pending messages when they are closed
+LINGER = 1000
+# Milliseconds a send waits for the connection to a receiver (or room in its queue) before the sender checks
+# whether the receiver is still a member (and keeps waiting if so)
+SEND_TIMEOUT = 1000
+
+
+class ZmqChannel(Channel):
+    """
+    ZmqChannel keeps the membership (join, leave, exists, subgroup) in redis like Channel, but exchanges
+    messages directly between members over ZeroMQ instead of redis queues. Messages take a single hop from
+    sender to receiver, and the throughput of the members is not bound by a central redis server.
+    Requires the optional pyzmq package.
+
+    Each member binds a PULL socket to a random port on endpoint_host when joining and advertises the
+    endpoint in redis. Senders look endpoints up once (cached until the next membership change) and push
+    envelopes over PUSH sockets connected to them (one socket per endpoint and thread, as ZeroMQ sockets
+    must not be shared by threads). Sockets only queue messages for established connections: a send
+    that can not deliver in time looks the receiver up again and fails with 'unknown receiver' if it left
+    in the meantime (instead of queueing the message for an endpoint nobody listens on anymore).
+    Envelopes, codecs, compression, routed messages and member handles work as for Channel, all members
+    of a channel have to be ZmqChannels.
+
+    Differences to Channel:
+    Messages are kept in ZeroMQ queues of the processes involved instead of redis, i.e. they are lost
+    if the receiver leaves or its process exits. Members can only receive in the channel they joined with.
+    Streams, bounded queues, expiry, reaping, priorities, shared broadcasts, shared memory and sharding
+    are not supported, and statistics do not include queue depths.
+    ZmqChannels can not be pickled.
+
+    Redis data Structures (in addition to the membership structures of Channel):
+
+    Member Endpoints
+        Key: "endpoints"
+        Value: redis hash of member ID strings and ZeroMQ endpoints ("tcp://<host>:<port>")
+    """
+
+    def __init__(self, endpoint_host: str = '127.0.0.1', context=None, **kwargs):
+        """
+        :param endpoint_host: address to bind the sockets of members to (reachable by all other members)
+        :param context: ZeroMQ context (the shared context of the process by default)
+        :param kwargs: arguments of Channel
+        """
+        if zmq is None:
+            raise ImportError('ZmqChannel requires the pyzmq package')
+        # check the arguments before the channel is set up (it would start a reaper right away)
+        unsupported: tuple = ('streams', 'max_queue_length', 'ttl', 'reap_interval', 'broadcast_threshold',
+                              'shared_memory_threshold', 'shards')
+        assert not any(kwargs.get(name) for name in unsupported) and kwargs.get('priorities', 1) == 1, \
+            'ZmqChannel supports neither streams, bounded queues, expiry, reaping, shared broadcasts, ' \
+            'shared memory, sharding nor priorities'
+        super().__init__(**kwargs)
+        self.endpoint_host: str = endpoint_host
+        self.__context = context or zmq.Context.instance()
+        # PULL sockets of the members that joined with this channel
+        self.__pull_sockets: dict = {}
+        # endpoints of members (only cached if membership changes are notified, i.e. for redis connections)
+        self.__endpoints: dict[str, str] = {}
+        self.__cache_endpoints: bool = isinstance(self.channel, redis.Redis)
+        # PUSH sockets per endpoint of each thread and all PUSH sockets of the channel (to close them)
+        self.__local = threading.local()
+        self.__push_sockets: list = []
+        self.__push_lock = threading.Lock()
+
+    def __getstate__(self) -> dict:
+        raise TypeError('ZmqChannel can not be pickled')
+
+    def _invalidate_membership(self, notification=None) -> None:
+        """ Drop local views of the member set, all subgroup sets and the endpoints of members """
+        super()._invalidate_membership(notification)
+        self.__endpoints = {}
+
+    def close(self) -> None:
+        """
+        Close the sockets of all members that joined with this channel and the PUSH sockets of all threads
+        (threads sending afterwards connect new ones).
+        :return: None
+        """
+        for socket in self.__pull_sockets.values():
+            socket.close(LINGER)
+        self.__pull_sockets = {}
+        with self.__push_lock:
+            for socket in self.__push_sockets:
+                socket.close(LINGER)
+            self.__push_sockets = []
+
+    def join(self, subgroup: str) -> str:
+        """
+        Join as a member to the global channel (see Channel) and advertise the endpoint of its socket.
+        :param subgroup: an identifier for the grouping
+        :return: global member id
+        """
+        # bind the socket first, so the endpoint is known right after claiming the id
+        socket = self.__context.socket(zmq.PULL)
+        port: int = socket.bind_to_random_port('tcp://' + self.endpoint_host)
+        pid: str = super().join(subgroup)
+        self.__pull_sockets[pid] = socket
+        self.channel.hset(self._key('endpoints'), pid, 'tcp://{}:{}'.format(self.endpoint_host, port))
+        return pid
+
+    def leave(self, subgroup: str):
+        """
+        Withdraw the endpoint of the calling member and unregister it (see Channel).
+        :param subgroup: subgroup identifier
+        :return: None
+        """
+        pid: str = self._caller()
+        self.channel.hdel(self._key('endpoints'), pid)
+        super().leave(subgroup)
+        socket = self.__pull_sockets.pop(pid, None)
+        if socket is not None:
+            socket.close(0)
+
+    def _queue_depths(self, caller: str) -> None:
+        """
+        Messages wait in ZeroMQ queues of the processes involved, which can not be sampled.
+        :param caller: receiver id
+        :return: None
+        """
+        return None
+
+    def __resolve(self, receivers) -> list[str]:
+        """
+        Look up the endpoints of receivers (reading unknown ones in one round trip, waiting for members that
+        have not advertised their endpoint yet).
+        :param receivers: iterable of receiver ids
+        :return: list of endpoints
+        """
+        endpoints: dict = self.__endpoints if self.__cache_endpoints else {}
+        missing: list = [receiver for receiver in receivers if receiver not in endpoints]
+        deadline: float = time.monotonic() + ENDPOINT_WAIT
+        delay: float = 0.001
+        while missing:
+            with self.channel.pipeline(transaction=False) as pipe:
+                for receiver in missing:
+                    pipe.hget(self._key('endpoints'), receiver)
+                results: list = pipe.execute()
+            for receiver, endpoint in zip(missing, results):
+                if endpoint is not None:
+                    endpoints[receiver] = endpoint.decode()
+            missing = [receiver for receiver in missing if receiver not in endpoints]
+            if missing:
+                assert time.monotonic() < deadline, 'no endpoint of receivers {}'.format(missing)
+                time.sleep(delay)
+                delay = min(2 * delay, 0.1)
+        return [endpoints[receiver] for receiver in receivers]
+
+    def __push_socket(self, endpoint: str):
+        """
+        Retrieve the PUSH socket of the calling thread connected to an endpoint (connecting it on first use).
+        :param endpoint: ZeroMQ endpoint of a receiver
+        :return: ZeroMQ socket
+        """
+        sockets = getattr(self.__local, 'sockets', None)
+        if sockets is None:
+            sockets = self.__local.sockets = {}
+        socket = sockets.get(endpoint)
+        # sockets might have been closed by another thread (see close)
+        if socket is None or socket.closed:
+            socket = sockets[endpoint] = self.__context.socket(zmq.PUSH)
+            socket.setsockopt(zmq.LINGER, LINGER)
+            # queue messages only for completed connections and report a send that can not deliver in time
+            socket.setsockopt(zmq.IMMEDIATE, 1)
+            socket.setsockopt(zmq.SNDTIMEO, SEND_TIMEOUT)
+            socket.connect(endpoint)
+            with self.__push_lock:
+                self.__push_sockets.append(socket)
+        return socket
+
+    def __drop_push_socket(self, endpoint: str) -> None:
+        """
+        Close the PUSH socket of the calling thread connected to an endpoint that was withdrawn.
+        :param endpoint: ZeroMQ endpoint of a former receiver
+        :return: None
+        """
+        socket = getattr(self.__local, 'sockets', {}).pop(endpoint, None)
+        if socket is not None:
+            socket.close(0)
+            with self.__push_lock:
+                if socket in self.__push_sockets:
+                    self.__push_sockets.remove(socket)
+
+    def __pull_socket(self, caller: str):
+        assert caller in self.__pull_sockets, 'receiver did not join with this channel'
+        return self.__pull_sockets[caller]
+
+    def __send(self, receiver: str, endpoint: str, envelope: bytes) -> None:
+        """
+        Send an envelope to the socket of a receiver, waiting as long as the receiver is still a member
+        (e.g. while its queue is full or its endpoint is not connected yet).
+        :param receiver: receiver id
+        :param endpoint: ZeroMQ endpoint of the receiver (as looked up before)
+        :param envelope: envelope bytes
+        :return: None
+        """
+        while True:
+            try:
+                self.__push_socket(endpoint).send(envelope, copy=False)
+                return
+            except zmq.Again:
+                # the local views might be stale: check that the receiver has not left in the meantime
+                with self.channel.pipeline(transaction=False) as pipe:
+                    pipe.sismember(self._key('members'), receiver)
+                    pipe.hget(self._key('endpoints'), receiver)
+                    member, current = pipe.execute()
+                if not member or current is None or current.decode() != endpoint:
+                    self._invalidate_membership()
+                    self.__drop_push_socket(endpoint)
+                    assert member and current is not None, 'unknown receiver'
+                    # the receiver joined again with a new endpoint
+                    endpoint = current.decode()
+                self.logger.debug("Waiting for receiver {} at {}".format(receiver, endpoint))
+
+    def __push(self, caller: str, destinations, message: object) -> int:
+        """
+        Push a message to the sockets of all destinations.
+        :param caller: sender id
+        :param destinations: iterable of receiver ids
+        :param message: the message object to be send
+        :return: number of envelope bytes pushed
+        """
+        envelope: bytes = self._encode(caller, message)
+        receivers: list = list(destinations)
+        for receiver, endpoint in zip(receivers, self.__resolve(receivers)):
+            self.__send(receiver, endpoint, envelope)
+        return len(envelope) * len(receivers)
+
+    def __receive(self, caller: str, sender_set: set | None, max_messages: int,
+                  timeout: int) -> list[tuple[str, Any]]:
+        """
+        Take up to max_messages messages from the senders off the local buffer or the socket of the caller,
+        blocking only if there is no message at all.
+        :param caller: receiver id
+        :param sender_set: set of sender ids or None for any sender
+        :param max_messages: maximum number of messages to return
+        :param timeout: optional timeout for blocking read (0 blocks forever)
+        :return: list of tuples of sender id and message
+        """
+        # serve buffered messages first (in order of arrival)
+        messages: list = self._take_pending(caller, sender_set, max_messages)
+        if messages:
+            return messages
+
+        socket = self.__pull_socket(caller)
+        deadline: float = time.monotonic() + timeout
+        while not messages:
+            remaining: float = deadline - time.monotonic()
+            if timeout != 0 and (remaining <= 0 or not socket.poll(max(1, int(remaining * 1000)))):
+                return []
+            messages = self._filter(caller, sender_set, [socket.recv()], limit=max_messages)
+
+        # take further messages that are already waiting without blocking
+        while len(messages) < max_messages:
+            try:
+                envelope: bytes = socket.recv(zmq.NOBLOCK)
+            except zmq.Again:
+                break
+            messages += self._filter(caller, sender_set, [envelope], limit=max_messages - len(messages))
+        return messages
+
+    def send_to(self, destination_set: set, message: object, priority: int = NORMAL_PRIORITY) -> None:
+        """
+        Sends an asynchronous multicast message directly to the members.
+        :param destination_set: a set of member identifiers
+        :param message: the message object to be send
+        :param priority: ignored (single priority)
+        :return: None
+        """
+        assert all(type(k) is str for k in destination_set), 'type error'
+        started: float = time.perf_counter()
+        caller: str = self._caller()
+        assert self.exists(caller), 'unknown sender'
+        self.logger.debug("{} sends {} to {}".format(caller, message, destination_set))
+        for destination in destination_set:
+            assert self.exists(destination), 'unknown receiver'
+        nbytes: int = self.__push(caller, destination_set, message)
+        self._record('send_to', started, len(destination_set), nbytes)
+
+    def send_to_all(self, message: object, priority: int = NORMAL_PRIORITY) -> None:
+        """
+        Sends an asynchronous broadcast message directly to all currently registered members.
+        :param message: the message object to be send
+        :param priority: ignored (single priority)
+        :return: None
+        """
+        started: float = time.perf_counter()
+        caller: str = self._caller()
+        assert self.exists(caller), 'unknown sender'
+        self.logger.debug("{} sends {} to all members".format(caller, message))
+        members: set = self.members()
+        nbytes: int = self.__push(caller, members, message)
+        self._record('send_to_all', started, len(members), nbytes)
+
+    def receive_from_any(self, timeout: int = 0) -> tuple[str, Any] | None:
+        """
+        Wait for the next message from any member.
+        :param timeout: optional timeout for blocking read
+        :return: tuple of sender id and message or None on timeout
+        """
+        started: float = time.perf_counter()
+        caller: str = self._caller()
+        assert self.exists(caller), 'unknown receiver'
+        received: int = self._received_bytes.get(caller, 0)
+        messages: list = self.__receive(caller, None, 1, timeout)
+        self._record('receive_from_any', started, len(messages), self._received_bytes.get(caller, 0) - received)
+        return messages[0] if messages else None
+
+    def receive_from(self, sender_set: set, timeout: int = 0) -> tuple[str, Any] | None:
+        """
+        Wait for the next message from the members specified in the sender_set
+        (messages of other senders are buffered for later receive calls).
+        :param sender_set: set of sender ids
+        :param timeout: optional timeout for blocking call
+        :return: tuple of sender id and message or None on timeout
+        """
+        started: float = time.perf_counter()
+        caller: str = self._caller()
+        assert self.exists(caller), 'unknown receiver'
+        for sender in sender_set:
+            assert self.exists(sender), 'unknown sender'
+        received: int = self._received_bytes.get(caller, 0)
+        messages: list = self.__receive(caller, set(sender_set), 1, timeout)
+        self._record('receive_from', started, len(messages), self._received_bytes.get(caller, 0) - received)
+        return messages[0] if messages else None
+
+    def receive_many(self, sender_set: set | None = None, max_messages: int = 100,
+                     timeout: int = 0) -> list[tuple[str, Any]]:
+        """
+        Wait for the next message like receive_from or receive_from_any and then take up to
+        max_messages - 1 further messages that are already waiting without blocking.
+        :param sender_set: set of sender ids or None for all members
+        :param max_messages: maximum number of messages to return
+        :param timeout: optional timeout for blocking on the first message
+        :return: list of tuples of sender id and message, empty on timeout
+        """
+        assert max_messages > 0, 'max_messages must be positive'
+        started: float = time.perf_counter()
+        caller: str = self._caller()
+        assert self.exists(caller), 'unknown receiver'
+        if sender_set is not None:
+            for sender in sender_set:
+                assert self.exists(sender), 'unknown sender'
+            sender_set = set(sender_set)
+        received: int = self._received_bytes.get(caller, 0)
+        messages: list = self.__receive(caller, sender_set, max_messages, timeout)
+        self._record('receive_many', started, len(messages), self._received_bytes.get(caller, 0) - received)
+        return messages
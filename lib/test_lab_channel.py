@@ -0,0 +1,774 @@
+"""
+Channel unit tests (on in-memory stores and, if fakeredis is installed, on an in-process redis server)
+"""
+
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+import unittest
+import warnings
+from multiprocessing import shared_memory
+from unittest import mock
+
+import redis
+
+from lib import lab_channel, lab_codec, lab_logging, lab_stats, lab_zmq
+
+try:
+    import fakeredis
+except ImportError:  # optional, the tests on redis are skipped without it
+    fakeredis = None
+
+lab_logging.setup(stream_level=logging.INFO)
+
+big_message = 'x' * 20000
+
+
+class MemoryBackend:
+    """ Channels on a MemoryStore """
+
+    def connect(self):
+        return lab_channel.MemoryStore()
+
+
+@unittest.skipIf(fakeredis is None, 'fakeredis is not installed')
+class RedisBackend:
+    """ Channels on a fake redis server (a new one for each test) """
+
+    def connect(self):
+        return fakeredis.FakeStrictRedis(server=fakeredis.FakeServer())
+
+
+def wait_until(condition, timeout: float = 5.0) -> bool:
+    """ Poll a condition (e.g. on state updated by a background thread) until it holds or the timeout expired """
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def exchange(store, message, **channel_args):
+    """ Send a message between two members of a new channel and return the received message """
+    channel = lab_channel.Channel(connection=store, **channel_args)
+    alice = channel.member(channel.join('client'))
+    bob = channel.member(channel.join('server'))
+    alice.send_to({bob.pid}, message)
+    return bob.receive_from({alice.pid}, timeout=1)[1]
+
+
+class QueueModeTests:
+    """Send and receive operations, run in both queue modes (see subclasses) on both backends"""
+    inbox = False
+
+    def setUp(self):
+        super().setUp()
+        self.store = self.connect()  # fresh store for each test
+        self.channel = lab_channel.Channel(connection=self.store, inbox=self.inbox)
+        self.alice = self.channel.member(self.channel.join('client'))
+        self.bob = self.channel.member(self.channel.join('server'))
+
+    def test_receive_from_returns_message_of_sender(self):
+        self.alice.send_to({self.bob.pid}, 'hello')
+        self.assertEqual(self.bob.receive_from({self.alice.pid}, timeout=1), (self.alice.pid, 'hello'))
+
+    def test_receive_from_any_times_out_without_messages(self):
+        self.assertIsNone(self.bob.receive_from_any(timeout=1))
+
+    def test_send_to_all_reaches_all_members(self):
+        self.alice.send_to_all('news')
+        self.assertEqual(self.bob.receive_from_any(timeout=1), (self.alice.pid, 'news'))
+        self.assertEqual(self.alice.receive_from_any(timeout=1), (self.alice.pid, 'news'))
+
+    def test_receive_from_keeps_messages_of_other_senders(self):
+        carol = self.channel.member(self.channel.join('client'))
+        carol.send_to({self.bob.pid}, 'from carol')
+        self.alice.send_to({self.bob.pid}, 'from alice')
+        self.assertEqual(self.bob.receive_from({self.alice.pid}, timeout=1), (self.alice.pid, 'from alice'))
+        self.assertEqual(self.bob.receive_from_any(timeout=1), (carol.pid, 'from carol'))
+
+    def test_receive_many_drains_backlog_in_order(self):
+        for i in range(10):
+            self.alice.send_to({self.bob.pid}, i)
+        self.assertEqual([m for _, m in self.bob.receive_many(max_messages=4, timeout=1)], [0, 1, 2, 3])
+        self.assertEqual([m for _, m in self.bob.receive_many(timeout=1)], [4, 5, 6, 7, 8, 9])
+
+    def test_receive_many_only_returns_messages_of_senders(self):
+        carol = self.channel.member(self.channel.join('client'))
+        carol.send_to({self.bob.pid}, 'from carol')
+        self.alice.send_to({self.bob.pid}, 'from alice')
+        self.assertEqual(self.bob.receive_many({self.alice.pid}, timeout=1), [(self.alice.pid, 'from alice')])
+        self.assertEqual(self.bob.receive_many(timeout=1), [(carol.pid, 'from carol')])
+
+    def test_receive_many_times_out_without_messages(self):
+        self.assertEqual(self.bob.receive_many(timeout=1), [])
+
+    def test_rejects_unknown_receiver(self):
+        with self.assertRaises(AssertionError):
+            self.alice.send_to({'999'}, 'lost')
+
+    def test_high_priority_messages_overtake_backlog(self):
+        channel = lab_channel.Channel(connection=self.store, inbox=self.inbox, priorities=2)
+        for i in range(3):
+            channel.member(self.alice.pid).send_to({self.bob.pid}, i)
+        channel.member(self.alice.pid).send_to({self.bob.pid}, 'stop', priority=lab_channel.HIGH_PRIORITY)
+        receiver = channel.member(self.bob.pid)
+        self.assertEqual(receiver.receive_from_any(timeout=1), (self.alice.pid, 'stop'))
+        self.assertEqual([m for _, m in receiver.receive_many(timeout=1)], [0, 1, 2])
+
+    def test_rejects_unknown_priority(self):
+        with self.assertRaises(AssertionError):
+            self.alice.send_to({self.bob.pid}, 'urgent', priority=lab_channel.HIGH_PRIORITY)
+
+
+class TestChannelQueues(QueueModeTests, MemoryBackend, unittest.TestCase):
+    """Sender-receiver queues"""
+
+
+class TestChannelQueuesOnRedis(QueueModeTests, RedisBackend, unittest.TestCase):
+    """Sender-receiver queues on redis"""
+
+
+class TestChannelInbox(QueueModeTests, MemoryBackend, unittest.TestCase):
+    """Single inbox per receiver"""
+    inbox = True
+
+
+class TestChannelInboxOnRedis(QueueModeTests, RedisBackend, unittest.TestCase):
+    """Single inbox per receiver on redis"""
+    inbox = True
+
+
+class TestCodecs(unittest.TestCase):
+    """Pluggable codecs"""
+
+    def test_pickle5_codec_passes_buffers_out_of_band(self):
+        message = {'payload': bytearray(b'abc' * 1000)}
+        self.assertEqual(exchange(lab_channel.MemoryStore(), message, codec=lab_codec.Pickle5Codec()), message)
+
+    def test_raw_codec_passes_bytes_through(self):
+        self.assertEqual(exchange(lab_channel.MemoryStore(), b'\x00\x01raw', codec=lab_codec.RawCodec()),
+                         b'\x00\x01raw')
+
+    @unittest.skipIf(lab_codec.msgpack is None, 'msgpack is not installed')
+    def test_msgpack_codec_decodes_sequences_as_tuples(self):
+        self.assertEqual(exchange(lab_channel.MemoryStore(), ['GET', 42], codec=lab_codec.MsgpackCodec()),
+                         ('GET', 42))
+
+
+class TestRouted(unittest.TestCase):
+    """Routed messages with a lazily decoded body"""
+
+    def test_routed_message_is_forwarded_with_its_header(self):
+        request = exchange(lab_channel.MemoryStore(), lab_channel.Routed(7, {'key': 3}, correlation_id=11))
+        forwarded = exchange(lab_channel.MemoryStore(), request.forward())
+        self.assertEqual((forwarded.kind, forwarded.correlation_id, forwarded.hops), (7, 11, 1))
+        self.assertEqual(forwarded.body, {'key': 3})
+
+    def test_compressed_body_is_forwarded_without_decoding(self):
+        request = exchange(lab_channel.MemoryStore(), lab_channel.Routed(7, big_message),
+                           compression='zlib', compress_threshold=1000)
+        forwarded = exchange(lab_channel.MemoryStore(), request.forward())
+        self.assertIsNotNone(request._Routed__codec)  # not decoded by the forwarding member
+        self.assertEqual(forwarded.body, big_message)
+
+
+class TestCompression(unittest.TestCase):
+    """Compression of large message bodies"""
+
+    def test_compressed_messages_are_smaller_in_the_store(self):
+        store = lab_channel.MemoryStore()
+        sender = lab_channel.Channel(connection=store, compression='zlib', compress_threshold=1000)
+        receiver = lab_channel.Channel(connection=store)  # decompresses regardless of its own settings
+        alice = sender.member(sender.join('client'))
+        bob = receiver.member(receiver.join('server'))
+        alice.send_to({bob.pid}, big_message)
+        self.assertLess(store.memory_usage(sender._queue_key(alice.pid, bob.pid)), len(big_message) // 10)
+        self.assertEqual(bob.receive_from_any(timeout=1), (alice.pid, big_message))
+
+    def test_small_messages_are_not_compressed(self):
+        self.assertEqual(exchange(lab_channel.MemoryStore(), 'tiny', compression='lzma', compress_threshold=1000),
+                         'tiny')
+
+    @unittest.skipIf(lab_codec.lz4 is None, 'lz4 is not installed')
+    def test_lz4_compression(self):
+        self.assertEqual(exchange(lab_channel.MemoryStore(), big_message, compression='lz4', compress_threshold=1000),
+                         big_message)
+
+
+class TestBoundedQueues(unittest.TestCase):
+    """Overflow policies of bounded queues"""
+
+    def setUp(self):
+        super().setUp()
+        self.store = lab_channel.MemoryStore()
+
+    def fill(self, overflow: str):
+        """ Send three messages to a queue bounded to two messages """
+        self.channel = lab_channel.Channel(connection=self.store, max_queue_length=2, overflow=overflow)
+        self.alice = self.channel.member(self.channel.join('client'))
+        self.bob = self.channel.member(self.channel.join('server'))
+        self.alice.send_to({self.bob.pid}, 0)
+        self.alice.send_to({self.bob.pid}, 1)
+        self.alice.send_to({self.bob.pid}, 2)
+
+    def received(self) -> list:
+        return [message for _, message in self.bob.receive_many(timeout=1)]
+
+    def test_drop_newest_discards_new_message(self):
+        self.fill('drop_newest')
+        self.assertEqual(self.received(), [0, 1])
+        self.assertEqual(self.channel.stats()['counters']['overflows'], 1)
+
+    def test_drop_oldest_trims_oldest_message(self):
+        self.fill('drop_oldest')
+        self.assertEqual(self.received(), [1, 2])
+
+    def test_raise_rejects_message(self):
+        with self.assertRaises(lab_channel.QueueFullError):
+            self.fill('raise')
+        self.assertEqual(self.received(), [0, 1])
+
+    def test_block_waits_for_receiver(self):
+        sender = threading.Thread(target=self.fill, args=('block',))
+        sender.start()
+        sender.join(timeout=0.5)
+        self.assertTrue(sender.is_alive())  # blocked by the full queue
+        self.assertEqual(self.bob.receive_from_any(timeout=1), (self.alice.pid, 0))
+        sender.join(timeout=5)
+        self.assertFalse(sender.is_alive())
+        self.assertEqual(self.received(), [1, 2])
+
+
+class TestBoundedQueuesOfReferences(unittest.TestCase):
+    """Trimming messages stored once or in shared memory off bounded queues (drop_oldest)"""
+
+    def setUp(self):
+        super().setUp()
+        self.store = lab_channel.MemoryStore()
+
+    def keys(self, pattern: str) -> list:
+        return list(self.store.scan_iter(match=pattern))
+
+    def members(self, channel, receivers: int):
+        sender = channel.member(channel.join('client'))
+        return sender, [channel.member(channel.join('server')) for _ in range(receivers)]
+
+    def test_trimmed_references_are_counted_down(self):
+        channel = lab_channel.Channel(connection=self.store, max_queue_length=1, overflow='drop_oldest',
+                                      broadcast_threshold=1000)
+        alice, receivers = self.members(channel, 2)
+        alice.send_to({bob.pid for bob in receivers}, big_message)
+        alice.send_to({bob.pid for bob in receivers}, big_message + 'y')
+        self.assertEqual(len(self.keys('blob:*')), 1)  # the first one was trimmed off all queues
+        for bob in receivers:
+            self.assertEqual(bob.receive_from_any(timeout=1), (alice.pid, big_message + 'y'))
+        self.assertEqual(self.keys('blob:*'), [])
+
+    @unittest.skipUnless(os.name == 'posix', 'shared memory hand-off requires POSIX')
+    def test_trimmed_shared_memory_handles_are_counted_down(self):
+        channel = lab_channel.Channel(connection=self.store, max_queue_length=1, overflow='drop_oldest',
+                                      shared_memory_threshold=1000)
+        alice, (bob,) = self.members(channel, 1)
+        alice.send_to({bob.pid}, big_message)
+        alice.send_to({bob.pid}, big_message + 'y')
+        self.assertEqual(len(self.keys('shm:*')), 1)  # the segment of the first one was unlinked
+        self.assertEqual(bob.receive_from_any(timeout=1), (alice.pid, big_message + 'y'))
+        self.assertEqual(self.keys('shm:*'), [])
+
+
+class TestExpiry(RedisBackend, unittest.TestCase):
+    """Expiry of unread messages"""
+
+    def test_messages_expire_one_by_one(self):
+        channel = lab_channel.Channel(connection=self.connect(), ttl=1)
+        alice = channel.member(channel.join('client'))
+        bob = channel.member(channel.join('server'))
+        alice.send_to({bob.pid}, 'old')
+        time.sleep(0.6)
+        alice.send_to({bob.pid}, 'new')  # also defers the expiry of the queue
+        self.assertGreater(channel.channel.ttl(channel._queue_key(alice.pid, bob.pid)), 0)
+        time.sleep(0.6)
+        self.assertEqual(bob.receive_many(timeout=1), [(alice.pid, 'new')])
+
+    def test_expiry_requires_redis(self):
+        with self.assertRaises(AssertionError):
+            lab_channel.Channel(connection=lab_channel.MemoryStore(), ttl=1)
+
+
+class TestReaping(unittest.TestCase):
+    """Deleting the queues of departed members"""
+
+    def setUp(self):
+        self.store = lab_channel.MemoryStore()
+        self.channel = lab_channel.Channel(connection=self.store)
+        self.alice = self.channel.member(self.channel.join('client'))
+        self.bob = self.channel.member(self.channel.join('server'))
+
+    def test_reap_deletes_queues_of_departed_members(self):
+        for i in range(3):
+            self.alice.send_to({self.bob.pid}, i)
+        self.store.srem('members', self.bob.pid)  # crashed without leaving
+        result = self.channel.reap()
+        self.assertEqual(result['queues'], 1)
+        self.assertGreater(result['bytes'], 0)
+        self.assertFalse(self.store.exists(self.channel._queue_key(self.alice.pid, self.bob.pid)))
+        self.assertEqual(self.channel.stats()['counters']['reaped_bytes'], result['bytes'])
+
+    def test_reap_keeps_queues_of_members_and_other_keys(self):
+        self.alice.send_to({self.bob.pid}, 'hello')
+        self.store.sadd(self.channel._queue_key(self.alice.pid, '99'), 'not a queue')
+        self.assertEqual(self.channel.reap(), {'queues': 0, 'bytes': 0})
+        self.assertTrue(self.store.exists(self.channel._queue_key(self.alice.pid, '99')))
+        self.assertEqual(self.bob.receive_from_any(timeout=1), (self.alice.pid, 'hello'))
+
+
+class TestSharedBroadcasts(unittest.TestCase):
+    """Large messages to several receivers stored once"""
+
+    def setUp(self):
+        super().setUp()
+        self.store = lab_channel.MemoryStore()
+        self.channel = lab_channel.Channel(connection=self.store, broadcast_threshold=1000)
+        self.alice = self.channel.member(self.channel.join('client'))
+        self.receivers = [self.channel.member(self.channel.join('server')) for _ in range(3)]
+
+    def blobs(self) -> list:
+        return self.store.scan_iter(match='blob:*')
+
+    def test_large_message_is_stored_once_and_deleted_by_last_receiver(self):
+        self.alice.send_to({receiver.pid for receiver in self.receivers}, big_message)
+        self.assertEqual(len(self.blobs()), 1)
+        for receiver in self.receivers:
+            self.assertEqual(receiver.receive_from_any(timeout=1), (self.alice.pid, big_message))
+        self.assertEqual(self.blobs(), [])
+
+    def test_references_of_reaped_queues_are_counted_down(self):
+        self.alice.send_to({receiver.pid for receiver in self.receivers}, big_message)
+        departed, *others = self.receivers
+        self.store.srem('members', departed.pid)  # crashed before receiving
+        self.assertEqual(self.channel.reap()['queues'], 1)
+        for receiver in others:
+            self.assertEqual(receiver.receive_from_any(timeout=1), (self.alice.pid, big_message))
+        self.assertEqual(self.blobs(), [])
+
+    def test_small_message_is_copied(self):
+        self.alice.send_to({receiver.pid for receiver in self.receivers}, 'small')
+        self.assertEqual(self.blobs(), [])
+        for receiver in self.receivers:
+            self.assertEqual(receiver.receive_from_any(timeout=1), (self.alice.pid, 'small'))
+
+
+@unittest.skipUnless(os.name == 'posix', 'shared memory hand-off requires POSIX')
+class TestSharedMemory(unittest.TestCase):
+    """Large messages handed over in shared memory segments"""
+
+    def setUp(self):
+        super().setUp()
+        self.store = lab_channel.MemoryStore()
+        self.channel = lab_channel.Channel(connection=self.store, shared_memory_threshold=1000)
+        self.alice = self.channel.member(self.channel.join('client'))
+        self.bob = self.channel.member(self.channel.join('server'))
+
+    def segments(self) -> list:
+        return [key.decode()[len('shm:'):] for key in self.store.scan_iter(match='shm:*')]
+
+    def assertUnlinked(self, name: str):
+        with self.assertRaises(FileNotFoundError):
+            shared_memory.SharedMemory(name=name, track=False)
+
+    def test_last_receiver_unlinks_segment(self):
+        self.alice.send_to({self.alice.pid, self.bob.pid}, big_message)
+        (name,) = self.segments()
+        self.assertEqual(self.bob.receive_from_any(timeout=1), (self.alice.pid, big_message))
+        self.assertEqual(self.alice.receive_from_any(timeout=1), (self.alice.pid, big_message))
+        self.assertEqual(self.segments(), [])
+        self.assertUnlinked(name)
+
+    def test_reaper_unlinks_segments_of_unread_handles(self):
+        self.alice.send_to({self.bob.pid}, big_message)
+        (name,) = self.segments()
+        self.store.srem('members', self.bob.pid)  # crashed before receiving
+        self.assertEqual(self.channel.reap()['queues'], 1)
+        self.assertEqual(self.segments(), [])
+        self.assertUnlinked(name)
+
+    def test_expiry_is_rejected(self):
+        # expired handles could not be counted down, their segments would leak (clients connect on first use)
+        with self.assertRaisesRegex(AssertionError, 'shared memory'):
+            lab_channel.Channel(connection=lab_channel.connect(), shared_memory_threshold=1000, ttl=1)
+
+
+class TestMemberHandles(unittest.TestCase):
+    """Many members per process"""
+
+    def setUp(self):
+        super().setUp()
+        self.channel = lab_channel.Channel(connection=lab_channel.MemoryStore(), inbox=True)
+
+    def test_handles_receive_concurrently_in_threads(self):
+        members = [self.channel.member(self.channel.join('worker')) for _ in range(5)]
+        received: dict = {}
+
+        def receive(member):
+            received[member.pid] = member.receive_from_any(timeout=5)
+
+        threads = [threading.Thread(target=receive, args=(member,)) for member in members]
+        for thread in threads:
+            thread.start()
+        for member in members:
+            members[0].send_to({member.pid}, 'for ' + member.pid)
+        for thread in threads:
+            thread.join(timeout=5)
+        self.assertEqual(received, {member.pid: (members[0].pid, 'for ' + member.pid) for member in members})
+
+    def test_bound_member_is_used_outside_of_handles(self):
+        bound = self.channel.join('client')
+        self.channel.bind(bound)
+        other = self.channel.member(self.channel.join('server'))
+        self.channel.send_to({other.pid}, 'hello')
+        self.assertEqual(other.receive_from_any(timeout=1), (bound, 'hello'))
+        other.send_to({bound}, 'reply')
+        self.assertEqual(self.channel.receive_from_any(timeout=1), (other.pid, 'reply'))
+
+
+class TestStats(unittest.TestCase):
+    """Periodic dumps of operation statistics"""
+
+    def test_dumps_continue_after_a_failing_snapshot(self):
+        snapshots = iter([ValueError('not serializable'), {'dump': 2}])
+        done = threading.Event()
+
+        def snapshot():
+            result = next(snapshots, None)
+            if result is None:
+                # park the (otherwise endless) dump thread
+                done.set()
+                threading.Event().wait()
+            if isinstance(result, Exception):
+                raise result
+            return result
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'stats.jsonl')
+            with self.assertLogs('vs2lab.stats', level='WARNING'):
+                lab_stats.dump_periodically(path, 0.05, snapshot)
+                self.assertTrue(done.wait(timeout=5))
+            with open(path, encoding='utf-8') as file:
+                self.assertEqual([json.loads(line) for line in file], [{'dump': 2}])
+
+
+class TestMembershipCache(RedisBackend, unittest.TestCase):
+    """Local membership views invalidated by pub/sub notifications"""
+
+    def setUp(self):
+        super().setUp()
+        self.store = self.connect()
+        self.channel = lab_channel.Channel(connection=self.store)
+        self.other = lab_channel.Channel(connection=self.store)
+
+    def test_view_is_served_locally_until_a_change_is_notified(self):
+        pid = self.other.join('server')
+        self.assertEqual(self.channel.subgroup('server'), {pid})
+        self.store.srem('server', pid)  # changed without notification
+        self.assertEqual(self.channel.subgroup('server'), {pid})
+
+    def test_view_is_invalidated_when_a_member_leaves(self):
+        pid = self.other.join('server')
+        self.assertEqual(self.channel.subgroup('server'), {pid})
+        self.other.member(pid).leave('server')
+        self.assertTrue(wait_until(lambda: self.channel.subgroup('server') == set()))
+        self.assertFalse(self.channel.exists(pid))
+
+
+class TestStreams(RedisBackend, unittest.TestCase):
+    """Queues stored as redis streams read through consumer groups"""
+
+    def setUp(self):
+        super().setUp()
+        self.store = self.connect()
+        self.channel = lab_channel.Channel(connection=self.store, streams=True, max_stream_length=5)
+        self.alice = self.channel.member(self.channel.join('client'))
+        self.bob = self.channel.member(self.channel.join('server'))
+        self.key = self.channel._queue_key(self.alice.pid, self.bob.pid)
+
+    def pending(self):
+        return self.store.xpending(self.key, lab_channel.STREAM_GROUP)['pending']
+
+    def test_receive_many_reads_batches_of_all_incoming_streams(self):
+        carol = self.channel.member(self.channel.join('client'))
+        for i in range(3):
+            self.alice.send_to({self.bob.pid}, i)
+            carol.send_to({self.bob.pid}, -i)
+        self.assertEqual(sorted(m for _, m in self.bob.receive_many(max_messages=10, timeout=1)),
+                         [-2, -1, 0, 0, 1, 2])
+
+    def test_messages_are_pending_until_acknowledged(self):
+        self.alice.send_to({self.bob.pid}, 'hello')
+        self.assertEqual(self.bob.receive_from_any(timeout=1), (self.alice.pid, 'hello'))
+        self.assertEqual(self.pending(), 1)
+        self.bob.ack()
+        self.assertEqual(self.pending(), 0)
+
+    def test_next_receive_acknowledges_previous_messages(self):
+        self.alice.send_to({self.bob.pid}, 'hello')
+        self.bob.receive_from_any(timeout=1)
+        self.assertIsNone(self.bob.receive_from_any(timeout=1))
+        self.assertEqual(self.pending(), 0)
+
+    def test_reclaim_takes_over_messages_of_crashed_receiver(self):
+        self.alice.send_to({self.bob.pid}, 'work')
+        self.bob.receive_from_any(timeout=1)  # crashes before acknowledging
+        restarted = lab_channel.Channel(connection=self.store, streams=True).member(self.bob.pid)
+        self.assertIsNone(restarted.receive_from_any(timeout=1))  # delivered already
+        self.assertEqual(restarted.reclaim(min_idle_time=0), [(self.alice.pid, 'work')])
+        restarted.ack()
+        self.assertEqual(self.pending(), 0)
+
+    def test_streams_are_trimmed_to_max_stream_length(self):
+        for i in range(200):
+            self.alice.send_to({self.bob.pid}, i)
+        self.assertLess(self.store.xlen(self.key), 200)
+        self.assertEqual(self.bob.receive_many(max_messages=200, timeout=1)[-1], (self.alice.pid, 199))
+
+    def test_streams_are_rejected_on_memory_stores(self):
+        with self.assertRaises(AssertionError):
+            lab_channel.Channel(connection=lab_channel.MemoryStore(), streams=True)
+
+
+class TestSharding(unittest.TestCase):
+    """Queues spread over several shards (memory stores) with the membership on a meta shard"""
+
+    def setUp(self):
+        self.meta = lab_channel.MemoryStore()
+        self.shards = [lab_channel.MemoryStore(), lab_channel.MemoryStore()]
+        self.channel = lab_channel.Channel(connection=self.meta, shards=self.shards)
+        self.client = self.channel.member(self.channel.join('client'))
+        self.servers = [self.channel.member(self.channel.join('server')) for _ in range(8)]
+
+    def placement(self, receiver):
+        """ Indices of the shards holding the queue from the client to the receiver """
+        key = self.channel._queue_key(self.client.pid, receiver.pid)
+        return [index for index, shard in enumerate(self.shards) if shard.exists(key)]
+
+    def test_queues_of_a_receiver_live_on_one_shard(self):
+        self.client.send_to_all('news')
+        placements = [self.placement(server) for server in self.servers]
+        self.assertTrue(all(len(placement) == 1 for placement in placements))
+        self.assertEqual({placement[0] for placement in placements}, {0, 1})  # both shards are used
+
+    def test_membership_stays_on_the_meta_shard(self):
+        self.assertEqual(len(self.meta.smembers('server')), 8)
+        self.assertFalse(any(shard.exists('members', 'server', 'client') for shard in self.shards))
+
+    def test_members_receive_across_shards(self):
+        other = lab_channel.Channel(connection=self.meta, shards=self.shards)  # same shards, same placement
+        self.client.send_to_all('news')
+        for server in self.servers:
+            self.assertEqual(other.member(server.pid).receive_from_any(timeout=1), (self.client.pid, 'news'))
+            server.send_to({self.client.pid}, server.pid)
+        replies = self.client.receive_many({server.pid for server in self.servers}, max_messages=20, timeout=1)
+        self.assertEqual(sorted(m for _, m in replies), sorted(server.pid for server in self.servers))
+
+
+@unittest.skipIf(fakeredis is None, 'fakeredis is not installed')
+class TestAsyncChannel(unittest.IsolatedAsyncioTestCase):
+    """AsyncChannel on a fake redis server (shared with a Channel)"""
+
+    async def asyncSetUp(self):
+        server = fakeredis.FakeServer()
+        self.store = fakeredis.FakeStrictRedis(server=server)
+        self.channel = lab_channel.AsyncChannel(connection=fakeredis.FakeAsyncRedis(server=server))
+        self.alice = self.channel.member(await self.channel.join('client'))
+        self.bob = self.channel.member(await self.channel.join('server'))
+
+    async def asyncTearDown(self):
+        await self.channel.close()
+
+    async def test_receive_from_returns_message_of_sender(self):
+        await self.alice.send_to({self.bob.pid}, 'hello')
+        self.assertEqual(await self.bob.receive_from({self.alice.pid}, timeout=1), (self.alice.pid, 'hello'))
+
+    async def test_receive_many_times_out_without_messages(self):
+        self.assertEqual(await self.bob.receive_many(timeout=1), [])
+
+    async def test_receive_many_drains_backlog_in_order(self):
+        for i in range(5):
+            await self.alice.send_to({self.bob.pid}, i)
+        self.assertEqual([m for _, m in await self.bob.receive_many(timeout=1)], [0, 1, 2, 3, 4])
+
+    async def test_high_priority_messages_overtake_backlog(self):
+        channel = lab_channel.AsyncChannel(connection=self.channel.channel, priorities=2)
+        alice, bob = channel.member(self.alice.pid), channel.member(self.bob.pid)
+        for i in range(3):
+            await alice.send_to({bob.pid}, i)
+        await alice.send_to({bob.pid}, 'stop', priority=lab_channel.HIGH_PRIORITY)
+        self.assertEqual(await bob.receive_from_any(timeout=1), (alice.pid, 'stop'))
+        self.assertEqual([m for _, m in await bob.receive_many(timeout=1)], [0, 1, 2])
+        await channel.close()
+
+    async def test_receives_messages_stored_once(self):
+        channel = lab_channel.Channel(connection=self.store, broadcast_threshold=1000)
+        carol = channel.member(channel.join('client'))
+        carol.send_to({self.alice.pid, self.bob.pid}, big_message)
+        for member in (self.alice, self.bob):
+            self.assertEqual(await member.receive_from_any(timeout=1), (carol.pid, big_message))
+        self.assertEqual(list(self.store.scan_iter(match='blob:*')), [])
+
+    async def test_handles_receive_concurrently_in_tasks(self):
+        members = [self.channel.member(await self.channel.join('worker')) for _ in range(5)]
+        receives = [asyncio.create_task(member.receive_from_any(timeout=5)) for member in members]
+        for member in members:
+            await self.alice.send_to({member.pid}, 'for ' + member.pid)
+        self.assertEqual(await asyncio.gather(*receives), [(self.alice.pid, 'for ' + member.pid) for member in members])
+
+    async def test_members_of_channel_and_async_channel_communicate(self):
+        channel = lab_channel.Channel(connection=self.store)
+        carol = channel.member(channel.join('client'))
+        carol.send_to({self.bob.pid}, 'from carol')
+        self.assertEqual(await self.bob.receive_from_any(timeout=1), (carol.pid, 'from carol'))
+        await self.bob.send_to({carol.pid}, 'reply')
+        self.assertEqual(carol.receive_from_any(timeout=1), (self.bob.pid, 'reply'))
+
+    async def test_views_are_dropped_when_notifications_fail(self):
+        self.assertTrue(await self.channel.exists(self.alice.pid))  # subscribes and fills the view
+        task = self.channel._AsyncChannel__membership_task
+        with mock.patch.object(self.channel._AsyncChannel__pubsub, 'get_message',
+                               side_effect=redis.ConnectionError('connection dropped')):
+            await asyncio.wait([task], timeout=5)
+        self.assertIsNone(self.channel._members)
+        self.store.srem('members', self.alice.pid)  # missed while the notifications failed
+        self.assertFalse(await self.channel.exists(self.alice.pid))
+        self.assertIsNot(self.channel._AsyncChannel__membership_task, task)  # subscribed again
+
+    async def test_pools_of_closed_event_loops_are_forgotten(self):
+        loop = asyncio.new_event_loop()
+        lab_channel._pool(redis.asyncio, loop, 'localhost', 6379, None)
+        loop.close()
+        lab_channel._pool(redis.asyncio, asyncio.get_running_loop(), 'localhost', 6379, None)
+        self.assertFalse([key for key in lab_channel._pools if key[1] is loop])
+
+
+@unittest.skipIf(lab_zmq.zmq is None, 'pyzmq is not installed')
+class TestZmqChannel(RedisBackend, unittest.TestCase):
+    """Messages exchanged over ZeroMQ with the membership in (fake) redis"""
+
+    def setUp(self):
+        super().setUp()
+        self.store = self.connect()
+        self.channel = lab_zmq.ZmqChannel(connection=self.store)
+        self.addCleanup(self.channel.close)
+        self.alice = self.channel.member(self.channel.join('client'))
+        self.bob = self.channel.member(self.channel.join('server'))
+
+    def test_receive_from_returns_message_of_sender(self):
+        self.alice.send_to({self.bob.pid}, 'hello')
+        self.assertEqual(self.bob.receive_from({self.alice.pid}, timeout=5), (self.alice.pid, 'hello'))
+        self.assertIsNone(self.bob.receive_from_any(timeout=0.1))
+
+    def test_handles_send_from_several_threads(self):
+        senders = [self.channel.member(self.channel.join('client')) for _ in range(4)]
+        threads = [threading.Thread(target=sender.send_to, args=({self.bob.pid}, sender.pid)) for sender in senders]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=5)
+        received = [self.bob.receive_from_any(timeout=5) for _ in senders]
+        self.assertEqual(sorted(received), sorted((sender.pid, sender.pid) for sender in senders))
+
+    def test_send_to_member_that_left_fails(self):
+        self.assertTrue(self.channel.exists(self.bob.pid))  # fills the views (and endpoints on first send)
+        self.alice.send_to({self.bob.pid}, 'hello')
+        views = self.channel._members, self.channel._ZmqChannel__endpoints.copy()
+        self.bob.leave('server')
+        # the sender did not learn about the departure yet
+        self.assertTrue(wait_until(lambda: self.channel._members is None))
+        self.channel._members, self.channel._ZmqChannel__endpoints = views
+        with self.assertRaises(AssertionError):
+            self.alice.send_to({self.bob.pid}, 'lost')
+        self.assertFalse(self.channel.exists(self.bob.pid))
+
+    def test_close_closes_sockets_of_all_threads(self):
+        sender = threading.Thread(target=self.alice.send_to, args=({self.bob.pid}, 'hello'))
+        sender.start()
+        sender.join(timeout=5)
+        sockets = list(self.channel._ZmqChannel__push_sockets)
+        self.assertEqual(len(sockets), 1)
+        self.channel.close()
+        self.assertTrue(all(socket.closed for socket in sockets))
+
+    def test_stats_cover_send_and_receive_operations(self):
+        self.alice.send_to({self.bob.pid}, 'hello')
+        self.bob.receive_from_any(timeout=5)
+        operations = self.channel.stats()['operations']
+        self.assertEqual(operations['send_to']['messages'], 1)
+        self.assertEqual(operations['receive_from_any']['bytes'], operations['send_to']['bytes'])
+
+
+class TestConnections(unittest.TestCase):
+    """Connection pools shared by the clients of a process"""
+
+    def test_clients_share_the_pool_of_a_server(self):
+        self.assertIs(lab_channel.connect('localhost', 6379).connection_pool,
+                      lab_channel.connect('localhost', 6379).connection_pool)
+        self.assertIsNot(lab_channel.connect('localhost', 6379).connection_pool,
+                         lab_channel.connect('localhost', 6380).connection_pool)
+
+    def test_clients_connect_over_unix_domain_sockets(self):
+        client = lab_channel.connect(unix_socket_path='/tmp/vs2lab-redis.sock')
+        self.assertIs(client.connection_pool.connection_class, redis.UnixDomainSocketConnection)
+        # pickled channels reconnect to the same pool by the socket path
+        self.assertEqual(lab_channel._spec(client), '/tmp/vs2lab-redis.sock')
+        self.assertIs(lab_channel._connection('/tmp/vs2lab-redis.sock').connection_pool, client.connection_pool)
+
+    @unittest.skipUnless(hasattr(os, 'fork'), 'requires fork')
+    def test_forked_child_resets_pools_and_channels(self):
+        channel = lab_channel.Channel(connection=lab_channel.MemoryStore())
+        pool = lab_channel.connect().connection_pool
+        lock = channel._Channel__membership_lock
+        lock.acquire()  # as if another thread was subscribing at fork time
+        channel._Channel__membership_pid = os.getpid()
+        with warnings.catch_warnings():
+            # notification threads of other tests are running, forking them is what the reset is for
+            warnings.simplefilter('ignore', DeprecationWarning)
+            child = os.fork()
+        if child == 0:
+            # exit status 0 only if the child neither inherited the pool nor the lock and subscription
+            os._exit(int(lab_channel.connect().connection_pool is pool
+                         or not channel._Channel__membership_lock.acquire(timeout=1)
+                         or channel._Channel__membership_pid is not None))
+        lock.release()
+        self.assertEqual(os.waitstatus_to_exitcode(os.waitpid(child, 0)[1]), 0)
+
+
+class TestSharedStore(unittest.TestCase):
+    """Store of a MemoryManager shared by several channels (as by the processes of the doit.py launchers)"""
+
+    @classmethod
+    def setUpClass(cls):
+        # spawned like the processes of the launchers (forking a process running pub/sub threads is unsafe)
+        cls._manager = lab_channel.MemoryManager(ctx=multiprocessing.get_context('spawn'))
+        cls._manager.start()  # start the server process of the store (called only once)
+
+    def test_channels_communicate_over_shared_store(self):
+        store = self._manager.MemoryStore()
+        server = lab_channel.Channel(connection=store)
+        client = lab_channel.Channel(connection=store)
+        server_pid = server.join('server')
+        client_pid = client.join('client')
+        client.member(client_pid).send_to({server_pid}, 'ping')
+        self.assertEqual(server.member(server_pid).receive_from_any(timeout=1), (client_pid, 'ping'))
+
+    @classmethod
+    def tearDownClass(cls):
+        cls._manager.shutdown()
+
+
+if __name__ == '__main__':
+    unittest.main()